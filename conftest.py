@@ -0,0 +1,15 @@
+import pytest
+from django.test.utils import override_settings
+
+from core.testing import TEST_SETTINGS
+
+
+@pytest.fixture(autouse=True, scope='session')
+def yatube_test_settings(django_test_environment, tmp_path_factory):
+    """Те же настройки, что включает core.testing.TestRunner.
+
+    Загрузки тестов ждут обработки во временной папке.
+    """
+    staging_root = str(tmp_path_factory.mktemp('staging'))
+    with override_settings(**TEST_SETTINGS, POSTS_STAGING_ROOT=staging_root):
+        yield
@@ -0,0 +1,187 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Проверять размер таблицы раз в столько записей, а не на каждой.
+CULL_EVERY = 100
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в отдельном файле SQLite, общий для всех процессов сервера.
+
+    В отличие от LocMemCache запись или удаление ключа в одном воркере
+    сразу видны остальным, а данные переживают перезапуск. Файл
+    открывается в режиме WAL, поэтому чтения не ждут записей.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        options = params.get('OPTIONS', {})
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+
+    def _connection(self):
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            connection = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = pid
+            self._local.writes = 0
+        return self._local.connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            'SELECT value, expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return default
+        value, expires = row
+        if expires is not None and expires < time.time():
+            self._connection().execute(
+                'DELETE FROM cache WHERE key = ? AND expires < ?',
+                (key, time.time()),
+            )
+            return default
+        return pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        names = {self._key(key, version): key for key in keys}
+        if not names:
+            return {}
+        placeholders = ', '.join('?' * len(names))
+        rows = self._connection().execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders}) '
+            'AND (expires IS NULL OR expires >= ?)',
+            (*names, time.time()),
+        )
+        return {names[key]: pickle.loads(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        self._cull()
+        self._connection().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+             self._expires(timeout)),
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires < ?',
+                (key, time.time()),
+            )
+            added = connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                 self._expires(timeout)),
+            ).rowcount
+        finally:
+            connection.execute('COMMIT')
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return bool(self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires >= ?)',
+            (self._expires(timeout), key, time.time()),
+        ).rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires >= ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key),
+            )
+        finally:
+            connection.execute('COMMIT')
+        return value
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires >= ?)',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        names = [self._key(key, version) for key in keys]
+        if names:
+            placeholders = ', '.join('?' * len(names))
+            self._connection().execute(
+                f'DELETE FROM cache WHERE key IN ({placeholders})', names
+            )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def _cull(self):
+        connection = self._connection()
+        self._local.writes += 1
+        if self._local.writes % CULL_EVERY != 1:
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires < ?', (time.time(),)
+        )
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache')
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+            'ORDER BY expires IS NULL, expires LIMIT ?)',
+            (count // self._cull_frequency,),
+        )
@@ -0,0 +1,73 @@
+"""Настройка SQLite для нескольких воркеров.
+
+WAL дает читать во время записи, а pragma-настройки задаются каждому
+новому соединению. Соединения живут CONN_MAX_AGE, поэтому настройка
+выполняется не на каждый запрос. Запись, которой не хватило
+busy timeout, повторяется целиком с растущей паузой.
+"""
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+from core.replicas import mark_written
+
+logger = logging.getLogger(__name__)
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение - размер кэша страниц в килобайтах.
+    'cache_size': -64 * 1024,
+}
+
+
+def pragmas():
+    return {**PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Обработчик connection_created: pragma для нового соединения."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas().items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_locked(error):
+    return 'database is locked' in str(error)
+
+
+def backoff(attempt):
+    """Пауза перед повтором: растет вдвое, со случайным разбросом."""
+    return (
+        settings.SQLITE_RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5)
+    )
+
+
+def retry_write(func, *args, **kwargs):
+    """Выполняет запись в транзакции и повторяет ее, если база занята.
+
+    Внутри чужой транзакции повторять нельзя: откат затронул бы
+    и внешний код, поэтому там ошибка пробрасывается сразу.
+    """
+    mark_written()
+    attempts = settings.SQLITE_WRITE_ATTEMPTS
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                return func(*args, **kwargs)
+        except OperationalError as error:
+            if (not is_locked(error) or connection.in_atomic_block
+                    or attempt == attempts - 1):
+                raise
+        delay = backoff(attempt)
+        logger.warning(
+            'База занята, повтор %s через %.3f с', attempt + 1, delay
+        )
+        time.sleep(delay)
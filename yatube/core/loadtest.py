@@ -0,0 +1,144 @@
+"""Нагрузка на SQLite из нескольких потоков: настройки Django и core.db.
+
+Каждый поток открывает свое соединение, как воркер сервера, и
+повторяет то, что делает add_comment: читает пост и в транзакции
+добавляет комментарий и сдвигает счетчик. Между записями потоки
+читают ленту.
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+from core import db
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT, '
+    'comments_count INTEGER NOT NULL DEFAULT 0)',
+    'CREATE TABLE comment (id INTEGER PRIMARY KEY, post_id INTEGER, '
+    'text TEXT)',
+)
+POSTS = 100
+
+
+class Result:
+    def __init__(self, name):
+        self.name = name
+        self.writes = self.reads = self.errors = self.retries = 0
+        self.elapsed = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, writes=0, reads=0, errors=0, retries=0):
+        with self.lock:
+            self.writes += writes
+            self.reads += reads
+            self.errors += errors
+            self.retries += retries
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'writes': self.writes,
+            'reads': self.reads,
+            'errors': self.errors,
+            'retries': self.retries,
+            'writes_per_second': round(self.writes / self.elapsed, 1),
+            'reads_per_second': round(self.reads / self.elapsed, 1),
+        }
+
+
+def create_database(path):
+    connection = sqlite3.connect(path)
+    for statement in SCHEMA:
+        connection.execute(statement)
+    connection.executemany(
+        'INSERT INTO post (id, text) VALUES (?, ?)',
+        ((number, f'Пост {number}') for number in range(1, POSTS + 1)),
+    )
+    connection.commit()
+    connection.close()
+
+
+def connect(path, tuned):
+    # Как Django: автокоммит и явный BEGIN; timeout 5 с по умолчанию.
+    options = {'timeout': 5}
+    if tuned:
+        options.update(settings.DATABASES['default'].get('OPTIONS', {}))
+    connection = sqlite3.connect(
+        path, isolation_level=None, check_same_thread=False, **options
+    )
+    if tuned:
+        for name, value in db.pragmas().items():
+            connection.execute(f'PRAGMA {name} = {value}')
+    return connection
+
+
+def comment(connection, post_id, number):
+    connection.execute('BEGIN')
+    try:
+        connection.execute(
+            'SELECT text FROM post WHERE id = ?', (post_id,)
+        ).fetchone()
+        connection.execute(
+            'INSERT INTO comment (post_id, text) VALUES (?, ?)',
+            (post_id, f'Комментарий {number}'),
+        )
+        connection.execute(
+            'UPDATE post SET comments_count = comments_count + 1 '
+            'WHERE id = ?', (post_id,),
+        )
+        connection.execute('COMMIT')
+    except sqlite3.OperationalError:
+        connection.execute('ROLLBACK')
+        raise
+
+
+def worker(path, tuned, writes, result):
+    connection = connect(path, tuned)
+    attempts = settings.SQLITE_WRITE_ATTEMPTS if tuned else 1
+    try:
+        for number in range(writes):
+            for attempt in range(attempts):
+                try:
+                    comment(connection, number % POSTS + 1, number)
+                except sqlite3.OperationalError as error:
+                    if (not db.is_locked(error)
+                            or attempt == attempts - 1):
+                        result.add(errors=1)
+                        break
+                    result.add(retries=1)
+                    time.sleep(db.backoff(attempt))
+                else:
+                    result.add(writes=1)
+                    break
+            connection.execute(
+                'SELECT id, text, comments_count FROM post '
+                'ORDER BY id DESC LIMIT 10'
+            ).fetchall()
+            result.add(reads=1)
+    finally:
+        connection.close()
+
+
+def run(tuned, workers=8, writes=200):
+    """Нагружает временную базу; возвращает Result."""
+    result = Result('core.db' if tuned else 'default')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'load.sqlite3')
+        create_database(path)
+        if tuned:
+            connect(path, tuned).close()
+        threads = [
+            threading.Thread(target=worker, args=(path, tuned, writes, result))
+            for _ in range(workers)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,23 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает временную базу SQLite записями из нескольких потоков '
+        'с настройками по умолчанию и с настройками core.db.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=200)
+
+    def handle(self, *args, **options):
+        for tuned in (False, True):
+            result = loadtest.run(
+                tuned, workers=options['workers'], writes=options['writes']
+            )
+            self.stdout.write(json.dumps(result.as_dict()))
@@ -0,0 +1,181 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger('core.profiling')
+
+# Замеры текущего запроса; None - запрос не попал в выборку.
+current = ContextVar('profiling_stats', default=None)
+MISSING = object()
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = Counter()
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_time = 0.0
+        self.cache_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.queries.values())
+
+    def duplicate_sql(self, limit=3):
+        return [
+            sql[:200] for (sql, _), count in self.queries.most_common(limit)
+            if count > 1
+        ]
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.sql_time += time.perf_counter() - started
+        stats.queries[sql, repr(params)] += 1
+
+
+def timed(counter, depth):
+    """Время только внешних вызовов: вложенные уже внутри них."""
+    def decorator(method):
+        def wrapper(*args, **kwargs):
+            stats = current.get()
+            if stats is None:
+                return method(*args, **kwargs)
+            setattr(stats, depth, getattr(stats, depth) + 1)
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                setattr(stats, depth, getattr(stats, depth) - 1)
+                if not getattr(stats, depth):
+                    setattr(stats, counter, getattr(stats, counter)
+                            + time.perf_counter() - started)
+        wrapper.profiled = True
+        return wrapper
+    return decorator
+
+
+def profile_cache_get(method):
+    def get(self, key, default=None, version=None):
+        value = method(self, key, MISSING, version)
+        stats = current.get()
+        if stats is not None and stats.cache_depth == 1:
+            if value is MISSING:
+                stats.cache_misses += 1
+            else:
+                stats.cache_hits += 1
+        return default if value is MISSING else value
+    return timed('cache_time', 'cache_depth')(get)
+
+
+def profile_cache_get_many(method):
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = method(self, keys, version=version)
+        stats = current.get()
+        if stats is not None and stats.cache_depth == 1:
+            stats.cache_hits += len(values)
+            stats.cache_misses += len(keys) - len(values)
+        return values
+    return timed('cache_time', 'cache_depth')(get_many)
+
+
+def install():
+    """Один раз оборачивает рендер шаблонов и чтения из кэшей.
+
+    Обертки ничего не делают, пока в contextvar нет замеров запроса.
+    """
+    if not getattr(Template._render, 'profiled', False):
+        Template._render = timed('template_time', 'template_depth')(
+            Template._render
+        )
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        if not getattr(backend.get, 'profiled', False):
+            backend.get = profile_cache_get(backend.get)
+        if not getattr(backend.get_many, 'profiled', False):
+            backend.get_many = profile_cache_get_many(backend.get_many)
+
+
+class ProfilingMiddleware:
+    """Замеры SQL, шаблонов и кэша для доли запросов.
+
+    Включается настройкой PROFILING_SAMPLE_RATE (от 0 до 1): при нуле
+    Django убирает middleware из цепочки. Попавший в выборку запрос
+    получает заголовок Server-Timing и строку JSON в логе core.profiling.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+        install()
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        stats = RequestStats()
+        token = current.set(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(record_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            current.reset(token)
+        total = time.perf_counter() - started
+        response['Server-Timing'] = server_timing(stats, total)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'sql_ms': round(stats.sql_time * 1000, 2),
+            'queries': stats.query_count,
+            'duplicates': stats.duplicates,
+            'duplicate_sql': stats.duplicate_sql(),
+            'template_ms': round(stats.template_time * 1000, 2),
+            'cache_ms': round(stats.cache_time * 1000, 2),
+            'cache_hits': stats.cache_hits,
+            'cache_misses': stats.cache_misses,
+        }, ensure_ascii=False))
+        return response
+
+
+def server_timing(stats, total):
+    return ', '.join((
+        f'sql;dur={stats.sql_time * 1000:.2f};'
+        f'desc="queries={stats.query_count} '
+        f'duplicates={stats.duplicates}"',
+        f'tpl;dur={stats.template_time * 1000:.2f}',
+        f'cache;dur={stats.cache_time * 1000:.2f};'
+        f'desc="hits={stats.cache_hits} misses={stats.cache_misses}"',
+        f'total;dur={total * 1000:.2f}',
+    ))
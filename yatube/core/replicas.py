@@ -0,0 +1,116 @@
+"""Чтение с реплик базы для страниц, которые только читают.
+
+Страницы, обернутые read_from_replica, читают со случайной реплики из
+DATABASE_REPLICAS. Запись всегда идет в основную базу, а после запроса,
+который мог что-то записать, клиент получает cookie, и следующие
+REPLICA_STICKY_SECONDS секунд тоже читает с основной базы: реплика
+может еще не догнать его изменения.
+
+Построенное по реплике не кэшируется и не получает ETag: отставшая
+реплика закрепила бы старые данные под новой версией кэша.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+reading = ContextVar('replica_reads', default=False)
+used = ContextVar('replica_used', default=False)
+wrote = ContextVar('primary_wrote', default=False)
+
+
+def mark_written():
+    """Запрос записал в базу, даже если пришел методом GET."""
+    wrote.set(True)
+
+
+def is_sticky(request):
+    return settings.REPLICA_STICKY_COOKIE in request.COOKIES
+
+
+def is_reading():
+    """Чтения сейчас идут на реплику."""
+    return bool(settings.DATABASE_REPLICAS) and reading.get()
+
+
+@contextmanager
+def read_from_primary():
+    """Чтения внутри блока идут в основную базу."""
+    token = reading.set(False)
+    try:
+        yield
+    finally:
+        reading.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if is_reading():
+            used.set(True)
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что в основной базе.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def read_from_replica(view):
+    """Отправляет чтения view на реплику, если клиент не только что писал."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS or is_sticky(request):
+            return view(request, *args, **kwargs)
+        token, used_token = reading.set(True), used.set(False)
+        try:
+            response = view(request, *args, **kwargs)
+            if used.get():
+                # Версии в ETag могут быть новее данных реплики.
+                del response['ETag']
+            return response
+        finally:
+            reading.reset(token)
+            used.reset(used_token)
+    return wrapper
+
+
+class ReplicaStickinessMiddleware:
+    """Ставит cookie чтения с основной базы после запроса с записью.
+
+    Запись видна по методу запроса или по mark_written, которую зовет
+    retry_write: подписка и отписка - это ссылки, то есть GET.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = wrote.set(False)
+        try:
+            response = self.get_response(request)
+            written = wrote.get()
+        finally:
+            wrote.reset(token)
+        if written or request.method not in SAFE_METHODS:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
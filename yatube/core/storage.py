@@ -0,0 +1,63 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+
+# Только эти папки адресуются по содержимому: имена миниатюр sorl
+# и временных файлов должны оставаться такими, как их задали.
+CONTENT_ADDRESSED = ('posts/',)
+HASHED_NAME = re.compile(r'/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def is_content_addressed(name):
+    return bool(name) and name.startswith(CONTENT_ADDRESSED)
+
+
+def content_name(directory, content, extension):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    name = digest.hexdigest()
+    return f'{directory}{name[:2]}/{name}{extension}'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, которое называет загрузки по SHA-256 содержимого.
+
+    Одинаковые файлы получают одно имя и лежат на диске один раз, а
+    значит и миниатюры sorl у них общие. Удалять такие файлы можно
+    только когда на них больше никто не ссылается: этим занимается
+    команда collect_media_garbage по счетчикам ссылок.
+    """
+
+    def _save(self, name, content):
+        if not is_content_addressed(name):
+            return super()._save(name, content)
+        directory = next(
+            prefix for prefix in CONTENT_ADDRESSED if name.startswith(prefix)
+        )
+        extension = os.path.splitext(name)[1].lower()
+        name = content_name(directory, content, extension)
+        if self.exists(name):
+            # Свежее время файла не даст сборщику мусора удалить его,
+            # пока пост со ссылкой на него еще не сохранен.
+            os.utime(self.path(name))
+            return name
+        try:
+            return super()._save(name, content)
+        except FileExistsError:
+            # Тот же файл успела записать параллельная загрузка.
+            return name
+
+    def get_available_name(self, name, max_length=None):
+        # Имя все равно заменит хэш; совпадение с существующим файлом
+        # для таких папок не конфликт, а повторная загрузка.
+        if not is_content_addressed(name):
+            return super().get_available_name(name, max_length)
+        if HASHED_NAME.search(name):
+            # Хэш-имя сюда передает только цикл FileSystemStorage._save,
+            # когда файл уже создан: другого имени для него нет.
+            raise FileExistsError(name)
+        return name
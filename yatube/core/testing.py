@@ -0,0 +1,28 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# Общий файл кэша пережил бы прогон тестов и отдал бы следующему прогону
+# страницы от чужой тестовой базы, а фоновые потоки писали бы в тестовую
+# базу мимо транзакции теста. Поэтому тесты кэшируют в памяти и
+# выполняют фоновые задачи сразу.
+TEST_SETTINGS = {
+    'CACHES': {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+    'POSTS_BACKGROUND_WORKERS': 0,
+}
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner, который включает TEST_SETTINGS на время прогона."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = override_settings(**TEST_SETTINGS)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,5 +1,33 @@
-from django.test import TestCase
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
 from http import HTTPStatus
+from unittest import mock
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import (
+    OperationalError, connection, connections, router, transaction
+)
+from django.http import HttpResponse
+from django.test import (
+    Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+)
+from django.urls import reverse
+
+from core import loadtest
+from core.cache import SQLiteCache
+from core.db import retry_write
+from core.replicas import ReplicaStickinessMiddleware
+from core.middleware import ProfilingMiddleware
+from posts.models import Post
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -10,3 +38,269 @@ class ViewTestClass(TestCase):
     def test_templ_error_page(self):
         response = self.client.get('/nonexist-page/')
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.location = os.path.join(directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {})
+
+    def test_set_get_delete(self):
+        """Значения сохраняются, читаются и удаляются."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertEqual(self.cache.get_many(['key', 'missing']),
+                         {'key': {'value': 1}})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_per_key_timeout(self):
+        """У каждого ключа свой срок жизни."""
+        self.cache.set('expired', 1, timeout=0)
+        self.cache.set('forever', 2, timeout=None)
+        self.cache.set('short', 3, timeout=60)
+        self.assertIsNone(self.cache.get('expired'))
+        self.assertTrue(self.cache.add('expired', 4))
+        self.assertFalse(self.cache.add('short', 5))
+        self.assertEqual(self.cache.get('forever'), 2)
+        self.assertEqual(self.cache.incr('short', 2), 5)
+
+    def test_invalidation_is_shared_between_processes(self):
+        """Удаление ключа в другом процессе видно сразу."""
+        other = SQLiteCache(self.location, {})
+        self.cache.set('page', 'html')
+        self.assertEqual(other.get('page'), 'html')
+        subprocess.run(
+            [sys.executable, '-c',
+             'import sys; from core.cache import SQLiteCache; '
+             'SQLiteCache(sys.argv[1], {}).delete("page")',
+             self.location],
+            cwd=settings.BASE_DIR,
+            check=True,
+        )
+        self.assertIsNone(self.cache.get('page'))
+        self.assertIsNone(other.get('page'))
+
+
+class ProfilingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def timings(self, response):
+        return dict(
+            entry.strip().split(';', 1)
+            for entry in response['Server-Timing'].split(',')
+        )
+
+    def test_disabled_by_default(self):
+        """Без PROFILING_SAMPLE_RATE заголовка нет."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_server_timing_and_log(self):
+        """Запрос из выборки получает Server-Timing и строку в логе."""
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            response = Client().get(reverse('posts:index'))
+        timings = self.timings(response)
+        self.assertEqual(
+            set(timings), {'sql', 'tpl', 'cache', 'total'}
+        )
+        self.assertIn('queries=2', timings['sql'])
+        self.assertIn('misses=', timings['cache'])
+        self.assertIn('"path": "/"', logs.output[0])
+        self.assertIn('"queries": 2', logs.output[0])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_cache_hits_counted(self):
+        """Повторный запрос к закэшированной странице - попадание."""
+        client = Client()
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            client.get(reverse('posts:index'))
+            client.get(reverse('posts:index'))
+        self.assertIn('"cache_misses": 0', logs.output[1])
+        self.assertNotIn('"cache_hits": 0', logs.output[1])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_duplicate_queries(self):
+        """Одинаковые запросы к базе считаются дублями."""
+        def view(request):
+            list(User.objects.all())
+            list(User.objects.all())
+            return HttpResponse()
+
+        middleware = ProfilingMiddleware(view)
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            response = middleware(RequestFactory().get('/'))
+        self.assertIn(
+            'queries=2 duplicates=1', response['Server-Timing']
+        )
+        self.assertIn('"duplicates": 1', logs.output[0])
+
+    @override_settings(PROFILING_SAMPLE_RATE=0.5)
+    def test_sampling(self):
+        """Вне выборки запрос проходит без замеров."""
+        middleware = ProfilingMiddleware(lambda request: HttpResponse())
+        with mock.patch('core.middleware.random.random', return_value=0.7):
+            response = middleware(RequestFactory().get('/'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class SQLiteTuningTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        """Новое соединение получает pragma из core.db."""
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('temp_store'), 2)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+
+    def test_load(self):
+        """Под параллельной записью с настройками нет ошибок блокировки."""
+        result = loadtest.run(True, workers=4, writes=50)
+        self.assertEqual(result.errors, 0)
+        self.assertEqual(result.writes, 200)
+
+
+@override_settings(SQLITE_RETRY_DELAY=0)
+class RetryWriteTest(TransactionTestCase):
+    def test_retries_locked(self):
+        """Занятая база - повод повторить запись."""
+        write = mock.Mock(
+            side_effect=[OperationalError('database is locked'), 'done']
+        )
+        with self.assertLogs('core.db', 'WARNING'):
+            self.assertEqual(retry_write(write, 1, key='value'), 'done')
+        self.assertEqual(write.call_count, 2)
+        write.assert_called_with(1, key='value')
+
+    def test_other_errors_raised(self):
+        """Другие ошибки и последняя попытка не глотаются."""
+        write = mock.Mock(side_effect=OperationalError('no such table'))
+        with self.assertRaises(OperationalError):
+            retry_write(write)
+        self.assertEqual(write.call_count, 1)
+        write = mock.Mock(side_effect=OperationalError('database is locked'))
+        with self.assertLogs('core.db', 'WARNING'):
+            with self.assertRaises(OperationalError):
+                retry_write(write)
+        self.assertEqual(write.call_count, settings.SQLITE_WRITE_ATTEMPTS)
+
+    def test_no_retry_inside_transaction(self):
+        """Внутри чужой транзакции повтор откатил бы и ее."""
+        write = mock.Mock(side_effect=OperationalError('database is locked'))
+        with transaction.atomic():
+            with self.assertRaises(OperationalError):
+                retry_write(write)
+        self.assertEqual(write.call_count, 1)
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    """Основная база - тестовая, реплика - копия в отдельном файле."""
+
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.databases['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections.databases['replica']
+        del connections._connections.replica
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def copy_to_replica(self):
+        connections['replica'].close()
+        connection.ensure_connection()
+        replica = sqlite3.connect(connections.databases['replica']['NAME'])
+        connection.connection.backup(replica)
+        replica.close()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+        self.post = Post.objects.create(author=self.user, text='Старый пост')
+        self.client.force_login(self.user)
+        self.copy_to_replica()
+        Post.objects.create(author=self.user, text='Новый пост')
+
+    def texts(self, response):
+        return [post.text for post in response.context['page_obj']]
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_reads_from_replica_until_write(self):
+        """Ленты читаются с реплики, а после записи - с основной базы."""
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(self.texts(response), ['Старый пост'])
+        response = self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'},
+        )
+        self.assertIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            self.texts(response), ['Новый пост', 'Старый пост']
+        )
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_follow_link_sticks_to_primary(self):
+        """Подписка по ссылке тоже переводит чтения на основную базу."""
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Пост автора')
+        response = self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(self.texts(response), ['Пост автора'])
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_cached_pages_built_from_primary(self):
+        """В кэш и под ETag попадают только страницы основной базы."""
+        with mock.patch(
+            'posts.templatetags.fragments.cache', wraps=cache
+        ) as fragment_cache:
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(self.texts(response), ['Старый пост'])
+        self.assertTrue(fragment_cache.get.called)
+        self.assertFalse(fragment_cache.set.called)
+        self.assertFalse(response.has_header('ETag'))
+        guest = Client()
+        for _ in range(2):
+            response = guest.get(reverse('posts:index'))
+            self.assertContains(response, 'Новый пост')
+            self.assertTrue(response.has_header('ETag'))
+        # Общая часть, собранная по основной базе, подходит и остальным.
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
+
+    def test_without_replicas(self):
+        """Без реплик все читается с основной базы."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            self.texts(response), ['Новый пост', 'Старый пост']
+        )
+        with self.assertRaises(MiddlewareNotUsed):
+            ReplicaStickinessMiddleware(HttpResponse)
@@ -1,5 +1,9 @@
 from django.contrib import admin
-from posts.models import Post, Group, Comment, Follow
+from posts import search
+from posts.models import (
+    AuthorStats, Comment, FeedCounter, Follow, Group, PopularPost, Post,
+    StoredFile,
+)
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -15,6 +19,16 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%...%' по всей таблице - полнотекстовый индекс.
+        if not search_term or not search.is_supported():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        if not search.match_expression(search_term):
+            return queryset.none(), False
+        return search.filter_matching(queryset, search_term), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = (
@@ -52,7 +66,51 @@ class FollowAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class AuthorStatsAdmin(admin.ModelAdmin):
+    list_display = (
+        'user',
+        'posts_count',
+    )
+    search_fields = ('user__username',)
+    readonly_fields = ('posts_count',)
+
+
+class PopularPostAdmin(admin.ModelAdmin):
+    list_display = (
+        'feed',
+        'post',
+        'score',
+    )
+    list_filter = ('feed',)
+    raw_id_fields = ('post',)
+    readonly_fields = ('score',)
+
+
+class StoredFileAdmin(admin.ModelAdmin):
+    list_display = (
+        'name',
+        'refcount',
+        'updated',
+    )
+    list_filter = ('updated',)
+    search_fields = ('name',)
+    readonly_fields = ('refcount', 'updated')
+
+
+class FeedCounterAdmin(admin.ModelAdmin):
+    list_display = (
+        'feed',
+        'posts_count',
+    )
+    search_fields = ('feed',)
+    readonly_fields = ('posts_count',)
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
+admin.site.register(AuthorStats, AuthorStatsAdmin)
+admin.site.register(FeedCounter, FeedCounterAdmin)
+admin.site.register(PopularPost, PopularPostAdmin)
+admin.site.register(StoredFile, StoredFileAdmin)
@@ -0,0 +1,241 @@
+"""Замеры горячих страниц на синтетических данных."""
+import json
+import math
+import random
+import time
+import tracemalloc
+from io import BytesIO, StringIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from faker import Faker
+from PIL import Image
+
+from posts import popular, search, timeline
+from posts.models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 1000
+
+SIZES = {
+    'users': 200,
+    'groups': 20,
+    'posts': 5000,
+    'comments': 10000,
+    'follows': 2000,
+    'images': 50,
+}
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def make_image(fake, name):
+    buffer = BytesIO()
+    Image.new('RGB', (1200, 800), fake.hex_color()).save(buffer, 'JPEG')
+    return default_storage.save(f'posts/{name}', ContentFile(
+        buffer.getvalue()
+    ))
+
+
+def seed(sizes, seed_value=0):
+    """Заполняет базу данными заданного размера через bulk_create.
+
+    bulk_create не шлет сигналов, поэтому счетчики, ленты подписок,
+    поисковый индекс и миниатюры после вставки строятся отдельно.
+    """
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed_value)
+    rng = random.Random(seed_value)
+    User.objects.bulk_create(
+        (User(username=f'user{number}') for number in range(sizes['users'])),
+        batch_size=BATCH_SIZE,
+    )
+    Group.objects.bulk_create(
+        (
+            Group(title=fake.sentence(nb_words=3)[:200],
+                  slug=f'group{number}', description=fake.text())
+            for number in range(sizes['groups'])
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    user_ids = list(User.objects.values_list('id', flat=True))
+    group_ids = list(Group.objects.values_list('id', flat=True)) + [None]
+    images = [
+        make_image(fake, f'bench{number}.jpg')
+        for number in range(sizes['images'])
+    ]
+    Post.objects.bulk_create(
+        (
+            Post(
+                text=fake.text(),
+                author_id=rng.choice(user_ids),
+                group_id=rng.choice(group_ids),
+                image=images[number] if number < len(images) else '',
+            )
+            for number in range(sizes['posts'])
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    post_ids = list(Post.objects.values_list('id', flat=True))
+    if post_ids:
+        Comment.objects.bulk_create(
+            (
+                Comment(text=fake.sentence(), post_id=rng.choice(post_ids),
+                        author_id=rng.choice(user_ids))
+                for _ in range(sizes['comments'])
+            ),
+            batch_size=BATCH_SIZE,
+        )
+    edges = set()
+    limit = min(sizes['follows'], len(user_ids) * (len(user_ids) - 1))
+    while len(edges) < limit:
+        edges.add(tuple(rng.sample(user_ids, 2)))
+    Follow.objects.bulk_create(
+        (Follow(user_id=user, author_id=author) for user, author in edges),
+        batch_size=BATCH_SIZE,
+    )
+    call_command('recount_feeds', stdout=StringIO())
+    for user_id, author_id in edges:
+        timeline.backfill(user_id, author_id)
+    search.reindex()
+    popular.rebuild()
+    if images:
+        call_command('generate_thumbnails', workers=1, stdout=StringIO())
+
+
+def most(queryset, relation):
+    return queryset.annotate(
+        total=Count(relation)
+    ).order_by('-total', 'pk').first()
+
+
+def endpoints():
+    """Имя, клиент и запрос для каждой замеряемой страницы."""
+    viewer = most(User.objects.all(), 'follower')
+    author = most(User.objects.all(), 'posts')
+    group = most(Group.objects.all(), 'posts')
+    post = most(Post.objects.all(), 'comments')
+    if None in (viewer, author, group, post):
+        raise BenchmarkError('Для замеров нужны пользователи, группы и посты.')
+    anonymous = Client()
+    authorized = Client()
+    authorized.force_login(viewer)
+    return (
+        ('index', anonymous, 'get', reverse('posts:index'), {}),
+        ('index_page_2', anonymous, 'get', reverse('posts:index'),
+         {'page': 2}),
+        ('group_posts', anonymous, 'get',
+         reverse('posts:group_list', args=(group.slug,)), {}),
+        ('profile', anonymous, 'get',
+         reverse('posts:profile', args=(author.username,)), {}),
+        ('post_detail', anonymous, 'get',
+         reverse('posts:post_detail', args=(post.pk,)), {}),
+        ('post_detail_authorized', authorized, 'get',
+         reverse('posts:post_detail', args=(post.pk,)), {}),
+        ('follow_index', authorized, 'get', reverse('posts:follow_index'),
+         {}),
+        ('popular', anonymous, 'get', reverse('posts:popular'), {}),
+        ('add_comment', authorized, 'post',
+         reverse('posts:add_comment', args=(post.pk,)),
+         {'text': 'Комментарий из замера'}),
+    )
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+def request(client, method, url, data):
+    response = getattr(client, method)(url, data)
+    if response.status_code >= 400:
+        raise BenchmarkError(f'{url}: ответ {response.status_code}')
+    return response
+
+
+def measure(client, method, url, data, repeat, cold=False):
+    """Задержки в мс, запросы к базе и пик памяти в КБ для страницы.
+
+    Память считается отдельным запросом: tracemalloc замедляет все
+    остальное в несколько раз и испортил бы задержки.
+    """
+    timings, queries = [], []
+    request(client, method, url, data)
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            request(client, method, url, data)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+    if cold:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        request(client, method, url, data)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'requests': repeat,
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+        'max_ms': round(max(timings), 2),
+        'queries': max(queries),
+        'memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run(repeat, cold=False):
+    return {
+        name: measure(client, method, url, data, repeat, cold)
+        for name, client, method, url, data in endpoints()
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Список регрессий относительно сохраненного прогона.
+
+    Время и память сравниваются с допуском tolerance (доля), число
+    запросов к базе - точно.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['queries'] > previous['queries']:
+            regressions.append(
+                f'{name}: запросов {previous["queries"]} -> '
+                f'{current["queries"]}'
+            )
+        for metric in ('p95_ms', 'memory_kb'):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(
+                    f'{name}: {metric} {previous[metric]} -> '
+                    f'{current[metric]}'
+                )
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_baseline(path, results, conditions):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(
+            {'conditions': conditions, 'results': results},
+            file, ensure_ascii=False, indent=2, sort_keys=True,
+        )
@@ -0,0 +1,174 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.replicas import is_reading, read_from_primary
+from posts.models import Post
+
+VERSION_KEY = 'posts:version:{}'
+PAGE_KEY = 'posts:page:{}'
+
+
+def index_scope():
+    return 'index'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def post_scopes(post):
+    """Страница поста зависит еще от автора (счетчик) и группы."""
+    scopes = [post_scope(post.pk), author_scope(post.author.username)]
+    if post.group_id:
+        scopes.append(group_scope(post.group.slug))
+    return scopes
+
+
+def image_scopes(name):
+    """Страницы всех постов с картинкой name, включая главную.
+
+    Файлы общие у одинаковых загрузок, поэтому постов может быть
+    несколько.
+    """
+    scopes = {index_scope()}
+    posts = Post.objects.filter(image=name).select_related('author', 'group')
+    for post in posts:
+        scopes.update(post_scopes(post))
+    return sorted(scopes)
+
+
+def post_detail_scopes(post_id):
+    scopes = [post_scope(post_id)]
+    row = Post.objects.filter(pk=post_id).values_list(
+        'author__username', 'group__slug'
+    ).first()
+    if row is not None:
+        scopes.append(author_scope(row[0]))
+        if row[1]:
+            scopes.append(group_scope(row[1]))
+    return scopes
+
+
+def version_key(scope):
+    # В slug и username бывает кириллица, а ключи кэша должны быть ASCII.
+    return VERSION_KEY.format(hashlib.md5(scope.encode()).hexdigest())
+
+
+def get_versions(*scopes):
+    """Текущие версии областей кэша.
+
+    Пропавшая из кэша версия заводится заново значением от времени,
+    а не нулем: иначе можно снова попасть на старые сохраненные страницы.
+    """
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return tuple(versions[key] for key in keys)
+
+
+def bump(*scopes):
+    """Сбрасывает все страницы, построенные по этим областям."""
+    for scope in scopes:
+        key = version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def page_key(request, scopes):
+    raw = ':'.join(map(str, (
+        request.get_full_path(), *scopes, *get_versions(*scopes)
+    )))
+    return PAGE_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def fragment_context(request, *scopes):
+    """Контекст для {% fragment %} общей для всех пользователей части.
+
+    Фрагмент, собранный по реплике, читается из кэша, но не сохраняется.
+    """
+    return {
+        'fragment_timeout': settings.FEED_CACHE_TIMEOUT,
+        'fragment_store': not is_reading(),
+        'fragment_key': page_key(request, scopes),
+    }
+
+
+def collect_scopes(request, scope_funcs, args, kwargs):
+    """Области страницы; считаются один раз за запрос."""
+    if not hasattr(request, '_feed_scopes'):
+        scopes = []
+        with read_from_primary():
+            for func in scope_funcs:
+                scope = func(*args, **kwargs)
+                scopes.extend([scope] if isinstance(scope, str) else scope)
+        request._feed_scopes = scopes
+    return request._feed_scopes
+
+
+def feed_etag(*scope_funcs):
+    """etag_func для condition: версии областей, адрес и зритель.
+
+    Не ходит в базу: меняется вместе с версиями, которые сдвигают сигналы.
+    """
+    def etag(request, *args, **kwargs):
+        scopes = collect_scopes(request, scope_funcs, args, kwargs)
+        viewer = 'anon'
+        if request.user.is_authenticated:
+            viewer = request.user.pk
+            scopes = [*scopes, follow_scope(viewer)]
+        raw = ':'.join(map(str, (
+            request.get_full_path(), viewer, *scopes, *get_versions(*scopes)
+        )))
+        return hashlib.md5(raw.encode()).hexdigest()
+    return etag
+
+
+def cache_feed(*scope_funcs):
+    """Кэширует ответ view для анонимов до изменения данных его областей.
+
+    scope_funcs получают аргументы view из URL и возвращают имя
+    области или список имен; сигналы моделей сдвигают версию области,
+    и все ключи страниц с прежней версией больше не читаются.
+    Авторизованным страница собирается заново: общая часть берется из
+    фрагментного кэша, а личные части (кнопки, формы, CSRF) - нет.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            scopes = collect_scopes(request, scope_funcs, args, kwargs)
+            key = page_key(request, scopes)
+            response = cache.get(key)
+            if response is None:
+                # Страница ляжет в кэш под текущей версией, поэтому
+                # строится по основной базе, а не по отставшей реплике.
+                with read_from_primary():
+                    response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.cookies:
+                    cache.set(key, response, settings.FEED_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
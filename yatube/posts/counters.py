@@ -0,0 +1,120 @@
+from django.conf import settings
+from django.db.models import (
+    Count, F, IntegerField, OuterRef, Subquery, Sum
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from core.replicas import read_from_primary
+from posts.models import (
+    AuthorStats, Comment, FeedCounter, Post, TimelineEntry
+)
+
+
+def index_feed():
+    return 'index'
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def timeline_feed(user_id):
+    return f'timeline:{user_id}'
+
+
+# SQLite ограничивает число параметров запроса.
+SHIFT_BATCH = 500
+
+
+def shift_timelines(user_ids, delta):
+    """Сдвигает счетчики записей в лентах подписок читателей.
+
+    Строки не создаются: без строки feed_count честно посчитает ленту
+    при первом чтении.
+    """
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), SHIFT_BATCH):
+        FeedCounter.objects.filter(feed__in=[
+            timeline_feed(user_id)
+            for user_id in user_ids[start:start + SHIFT_BATCH]
+        ]).update(posts_count=Greatest(F('posts_count') + delta, 0))
+
+
+def feed_count(feed, posts):
+    """Число постов ленты из счетчика; без счетчика - честный COUNT.
+
+    Строка заводится по основной базе: счет с отстающей реплики
+    остался бы в счетчике навсегда.
+    """
+    counter = FeedCounter.objects.filter(feed=feed).values_list(
+        'posts_count', flat=True
+    ).first()
+    if counter is None:
+        with read_from_primary():
+            counter, _ = FeedCounter.objects.get_or_create(
+                feed=feed, defaults={'posts_count': posts.count()}
+            )
+        counter = counter.posts_count
+    return counter
+
+
+def index_count():
+    return feed_count(index_feed(), Post.objects.all())
+
+
+def group_count(group):
+    return feed_count(group_feed(group.pk), group.posts.all())
+
+
+def author_count(author):
+    return AuthorStats.for_user(author).posts_count
+
+
+def follow_count(user):
+    """Приблизительный размер ленты подписок.
+
+    Записи ленты берутся из счетчика читателя, который двигают
+    раскладка, подписка и отписка, а посты популярных авторов, которые
+    в ленту не раскладываются, - из их счетчиков.
+    """
+    pushed = feed_count(
+        timeline_feed(user.pk), TimelineEntry.objects.filter(user=user)
+    )
+    pulled = AuthorStats.objects.filter(
+        user__following__user=user,
+        followers_count__gte=settings.TIMELINE_PULL_FOLLOWERS,
+    ).aggregate(total=Sum('posts_count'))['total']
+    return pushed + (pulled or 0)
+
+
+def recount_comments():
+    """Пересчитывает Post.comments_count; возвращает число постов."""
+    return Post.objects.update(comments_count=Coalesce(Subquery(
+        Comment.objects.filter(post=OuterRef('pk')).order_by().values(
+            'post'
+        ).annotate(total=Count('id')).values('total'),
+        output_field=IntegerField(),
+    ), 0))
+
+
+def recount():
+    """Пересчитывает счетчики лент по таблице постов."""
+    counters = [FeedCounter(feed=index_feed(),
+                            posts_count=Post.objects.count())]
+    groups = Post.objects.filter(group__isnull=False).order_by().values(
+        'group'
+    ).annotate(total=Count('id')).values_list('group', 'total')
+    counters.extend(
+        FeedCounter(feed=group_feed(group_id), posts_count=total)
+        for group_id, total in groups.iterator()
+    )
+    timelines = TimelineEntry.objects.order_by().values('user').annotate(
+        total=Count('id')
+    ).values_list('user', 'total')
+    counters.extend(
+        FeedCounter(feed=timeline_feed(user_id), posts_count=total)
+        for user_id, total in timelines.iterator()
+    )
+    FeedCounter.objects.all().delete()
+    FeedCounter.objects.bulk_create(counters)
+    return len(counters)
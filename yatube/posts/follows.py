@@ -0,0 +1,79 @@
+"""Подписки зрителя: одним запросом на страницу и с кэшем на пользователя.
+
+FollowGraph отвечает, на каких из авторов A1..An подписан пользователь,
+и запоминает ответы до конца запроса. Множество id всех авторов, на
+которых подписан пользователь, лежит в кэше до подписки или отписки;
+у тех, кто подписан на очень многих, оно не кэшируется, и проверка
+идет одним запросом по нужным авторам.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+
+from posts.models import Follow
+
+FOLLOWED_KEY = 'posts:followed:{}'
+
+
+def followed_key(user_id):
+    return FOLLOWED_KEY.format(user_id)
+
+
+def cached_followed_ids(user_id):
+    """Множество id авторов пользователя или None, если их слишком много."""
+    key = followed_key(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        limit = settings.FOLLOW_CACHE_MAX_AUTHORS
+        # Кэш общий для всех запросов, поэтому заполняется с основной
+        # базы, а не с реплики, которая может отставать.
+        ids = list(Follow.objects.using(
+            router.db_for_write(Follow)
+        ).filter(user_id=user_id).values_list('author_id', flat=True)[
+            :limit + 1
+        ])
+        if len(ids) > limit:
+            ids = False
+        cache.set(key, ids, settings.FOLLOW_CACHE_TIMEOUT)
+    if ids is False:
+        return None
+    return set(ids)
+
+
+def invalidate(user_id):
+    cache.delete(followed_key(user_id))
+
+
+class FollowGraph:
+    """Подписки одного пользователя на время запроса."""
+
+    def __init__(self, user):
+        self.user_id = user.pk if user.is_authenticated else None
+        self.memo = {}
+
+    def following(self, author_ids):
+        """{id автора: подписан ли пользователь} для всех author_ids."""
+        author_ids = set(author_ids)
+        missing = author_ids - self.memo.keys()
+        if missing and self.user_id is None:
+            self.memo.update(dict.fromkeys(missing, False))
+        elif missing:
+            followed = cached_followed_ids(self.user_id)
+            if followed is None:
+                followed = set(Follow.objects.filter(
+                    user_id=self.user_id, author_id__in=missing
+                ).values_list('author_id', flat=True))
+            self.memo.update(
+                (author_id, author_id in followed) for author_id in missing
+            )
+        return {author_id: self.memo[author_id] for author_id in author_ids}
+
+    def is_following(self, author_id):
+        return self.following((author_id,))[author_id]
+
+
+def follow_graph(request):
+    """FollowGraph зрителя, один на запрос."""
+    if not hasattr(request, '_follow_graph'):
+        request._follow_graph = FollowGraph(request.user)
+    return request._follow_graph
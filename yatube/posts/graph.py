@@ -0,0 +1,88 @@
+"""Граф подписок без COUNT по всей таблице Follow.
+
+Счетчики подписчиков и подписок лежат в AuthorStats и двигаются
+сигналами. Взаимные подписки проверяются по уникальному индексу
+(user, author) и обратному (author, user). Рекомендации «подписки
+ваших подписок» и их веса заранее считает команда
+refresh_follow_graph в таблицу FollowSuggestion.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from posts.models import AuthorStats, Follow, FollowSuggestion, User
+
+
+def is_mutual(user_id, other_id):
+    """Подписаны ли пользователи друг на друга: два поиска по индексу."""
+    return Follow.objects.filter(
+        Q(user_id=user_id, author_id=other_id)
+        | Q(user_id=other_id, author_id=user_id)
+    ).count() == 2
+
+
+def mutual_follows(user):
+    """Авторы, на которых подписан user и которые подписаны на него."""
+    return User.objects.filter(
+        following__user=user, follower__author=user
+    )
+
+
+def suggestions(user, limit=None):
+    """Рекомендованные авторы из FollowSuggestion, лучшие первыми."""
+    limit = limit or settings.FOLLOW_SUGGESTIONS
+    return [
+        suggestion.author for suggestion in FollowSuggestion.objects.filter(
+            user=user
+        ).select_related('author').order_by('-score', 'author_id')[:limit]
+    ]
+
+
+def top_followed(limit=10):
+    """Авторы с наибольшим числом подписчиков, по индексу AuthorStats."""
+    return [
+        stats.user for stats in AuthorStats.objects.filter(
+            followers_count__gt=0
+        ).select_related('user').order_by('-followers_count', 'user_id')[
+            :limit
+        ]
+    ]
+
+
+def suggest(user_ids, limit):
+    """{id читателя: [(id автора, вес)]} для пачки читателей.
+
+    Вес - сколько подписок читателя подписаны на автора. Одна выборка
+    по рёбрам второго шага на всю пачку.
+    """
+    followed = {user_id: set() for user_id in user_ids}
+    for user_id, author_id in Follow.objects.filter(
+        user_id__in=user_ids, author__isnull=False
+    ).values_list('user_id', 'author_id').iterator():
+        followed[user_id].add(author_id)
+    scores = {user_id: Counter() for user_id in user_ids}
+    for user_id, author_id in Follow.objects.filter(
+        user__following__user_id__in=user_ids, author__isnull=False
+    ).values_list('user__following__user_id', 'author_id').iterator():
+        if author_id != user_id and author_id not in followed[user_id]:
+            scores[user_id][author_id] += 1
+    return {
+        user_id: counter.most_common(limit)
+        for user_id, counter in scores.items()
+    }
+
+
+def refresh_suggestions(user_ids, limit=None):
+    """Пересчитывает рекомендации пачки читателей одной транзакцией."""
+    limit = limit or settings.FOLLOW_SUGGESTIONS
+    rows = [
+        FollowSuggestion(user_id=user_id, author_id=author_id, score=score)
+        for user_id, pairs in suggest(user_ids, limit).items()
+        for author_id, score in pairs
+    ]
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(user_id__in=user_ids).delete()
+        FollowSuggestion.objects.bulk_create(rows)
+    return len(rows)
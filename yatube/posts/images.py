@@ -0,0 +1,225 @@
+"""Обработка загруженных картинок постов вне запроса."""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from PIL import Image, ImageOps
+from sorl import thumbnail
+
+from core.db import retry_write
+from core.storage import CONTENT_ADDRESSED
+from posts import tasks
+from posts.models import Post, StoredFile
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+
+
+def defer_upload(form, post):
+    """Убирает новую картинку из сохранения формы.
+
+    До окончания обработки у поста остается прежняя картинка (или
+    никакой) и статус processing. Возвращает загрузку для schedule
+    или None, если новой картинки нет.
+    """
+    upload = form.cleaned_data.get('image')
+    if not isinstance(upload, UploadedFile):
+        return None
+    post.image = form.initial.get('image') or ''
+    post.image_status = Post.IMAGE_PROCESSING
+    return upload
+
+
+def staging_storage():
+    """Загрузки до обработки: вне MEDIA_ROOT, сервер их не раздает.
+
+    В исходниках остаются EXIF и геометки, поэтому отдавать их нельзя.
+    """
+    return FileSystemStorage(location=settings.POSTS_STAGING_ROOT)
+
+
+def stage(post_id, upload):
+    """Кладет загрузку в <id поста>/ хранилища staging кусками."""
+    return staging_storage().save(
+        f'{post_id}/{os.path.basename(upload.name)}', upload
+    )
+
+
+def schedule(post, upload):
+    """Ставит обработку в фоновый пул; вызывать после коммита поста."""
+    if upload is not None:
+        staged = stage(post.pk, upload)
+        tasks.submit(('image', staged), process, post.pk, staged)
+
+
+def staged_images():
+    """(id поста, файл) для загрузок, которые еще не обработаны."""
+    storage = staging_storage()
+    if not os.path.isdir(storage.location):
+        return
+    for directory in storage.listdir('')[0]:
+        if not directory.isdigit():
+            continue
+        for name in storage.listdir(directory)[1]:
+            yield int(directory), f'{directory}/{name}'
+
+
+def edit_fields(form, upload):
+    """Поля, которые пишет правка поста.
+
+    Картинку и ее статус ставит обработка: полное сохранение вернуло бы
+    прочитанные до нее значения поверх результата. Статус пишется,
+    только если правка сама ставит новую картинку в очередь, а картинка -
+    только если ее убрали.
+    """
+    fields = [name for name in form._meta.fields if name != 'image']
+    if upload is not None:
+        fields.append('image_status')
+    elif form.cleaned_data.get('image') is False:
+        fields.append('image')
+    return fields
+
+
+def reencode(source):
+    """Картинка без EXIF, повернутая по нему и не больше максимума."""
+    with Image.open(source) as image:
+        image_format = image.format
+        if image_format not in FORMATS:
+            image_format = 'JPEG'
+        if getattr(image, 'is_animated', False):
+            # Перекодирование оставило бы от анимации первый кадр.
+            source.seek(0)
+            return source.read(), image_format
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(settings.POSTS_IMAGE_MAX_SIZE, Image.LANCZOS)
+        options = {}
+        if image_format in ('JPEG', 'WEBP'):
+            options = {
+                'quality': settings.POSTS_IMAGE_QUALITY,
+                'optimize': True,
+            }
+            if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+        buffer = BytesIO()
+        image.save(buffer, image_format, **options)
+        return buffer.getvalue(), image_format
+
+
+def discard(staged):
+    """Удаляет файл из staging вместе с опустевшей папкой поста."""
+    storage = staging_storage()
+    storage.delete(staged)
+    try:
+        os.rmdir(os.path.dirname(storage.path(staged)))
+    except OSError:
+        # В папке есть другие загрузки поста или ее уже нет.
+        pass
+
+
+def process(post_id, staged):
+    """Обрабатывает картинку из staging и ставит ее посту.
+
+    Исходник удаляется только после записи результата: если база так
+    и не освободилась, загрузку подберет process_staged_images.
+    """
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        discard(staged)
+        return
+    try:
+        with staging_storage().open(staged) as source:
+            content, _ = reencode(source)
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', staged)
+        post.image_status = Post.IMAGE_FAILED
+        retry_write(post.save, update_fields=('image_status',))
+        discard(staged)
+        return
+    post.image.save(
+        os.path.basename(staged), ContentFile(content), save=False
+    )
+    post.image_status = Post.IMAGE_READY
+    retry_write(post.save, update_fields=('image', 'image_status'))
+    discard(staged)
+
+
+def recount_files():
+    """Пересчитывает ссылки на файлы по таблице постов."""
+    with transaction.atomic():
+        StoredFile.objects.update(refcount=0)
+        for prefix in CONTENT_ADDRESSED:
+            images = Post.objects.filter(image__startswith=prefix).order_by(
+            ).values('image').annotate(total=Count('id'))
+            for row in images.iterator():
+                StoredFile.objects.update_or_create(
+                    name=row['image'], defaults={'refcount': row['total']}
+                )
+
+
+def stored_names(directory):
+    """Все файлы папки хранилища, включая вложенные."""
+    if not default_storage.exists(directory):
+        return
+    directories, files = default_storage.listdir(directory)
+    for name in files:
+        yield f'{directory}{name}'
+    for name in directories:
+        yield from stored_names(f'{directory}{name}/')
+
+
+def untracked_files():
+    """Файлы без строки StoredFile, например загруженные до ее появления."""
+    for prefix in CONTENT_ADDRESSED:
+        for name in stored_names(prefix):
+            if not StoredFile.objects.filter(name=name).exists():
+                yield name
+
+
+def is_garbage(name, cutoff):
+    """Файл никому не нужен и давно не загружался повторно.
+
+    Хранилище обновляет время файла, когда отдает его повторной
+    загрузке, поэтому свежие файлы не трогаем: пост со ссылкой на
+    такой файл мог еще не сохраниться.
+    """
+    if Post.objects.filter(image=name).exists():
+        return False
+    if not default_storage.exists(name):
+        return True
+    return default_storage.get_modified_time(name) < cutoff
+
+
+def delete_file(name):
+    """Удаляет файл вместе с его миниатюрами."""
+    thumbnail.delete(name, delete_file=default_storage.exists(name))
+    StoredFile.objects.filter(name=name).delete()
+
+
+def collect_garbage(grace, scan=False, dry_run=False):
+    """Удаляет файлы без ссылок старше grace; возвращает их имена."""
+    cutoff = timezone.now() - grace
+    candidates = StoredFile.objects.filter(
+        refcount=0, updated__lt=cutoff
+    ).values_list('name', flat=True)
+    names = list(candidates.iterator())
+    if scan:
+        names.extend(untracked_files())
+    deleted = []
+    for name in names:
+        with transaction.atomic():
+            if StoredFile.objects.filter(name=name, refcount__gt=0).exists():
+                continue
+            if not is_garbage(name, cutoff):
+                continue
+            if not dry_run:
+                delete_file(name)
+        deleted.append(name)
+    return deleted
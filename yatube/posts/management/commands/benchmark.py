@@ -0,0 +1,92 @@
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from posts import benchmark
+
+BENCHMARK_SETTINGS = {
+    'ALLOWED_HOSTS': ['testserver'],
+    'CACHES': {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+    'POSTS_BACKGROUND_WORKERS': 0,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержки, число запросов и память горячих страниц '
+        'на синтетических данных во временной базе.'
+    )
+
+    def add_arguments(self, parser):
+        for name, default in benchmark.SIZES.items():
+            parser.add_argument(f'--{name}', type=int, default=default)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.',
+        )
+        parser.add_argument('--baseline', help='JSON прошлого прогона.')
+        parser.add_argument('--save', help='Куда сохранить этот прогон.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый рост времени и памяти, доля.',
+        )
+
+    def handle(self, *args, **options):
+        sizes = {name: options[name] for name in benchmark.SIZES}
+        conditions = {
+            **sizes, 'seed': options['seed'], 'cold': options['cold']
+        }
+        baseline = None
+        if options['baseline']:
+            baseline = benchmark.load_baseline(options['baseline'])
+            if baseline['conditions'] != conditions:
+                raise CommandError(
+                    'Базовый прогон снят на других данных: '
+                    f'{baseline["conditions"]}'
+                )
+        old_name = connection.settings_dict['NAME']
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root, **BENCHMARK_SETTINGS
+        ):
+            connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False
+            )
+            try:
+                self.stdout.write(f'Заполнение базы: {conditions}')
+                benchmark.seed(sizes, options['seed'])
+                results = benchmark.run(options['repeat'], options['cold'])
+            except benchmark.BenchmarkError as error:
+                raise CommandError(error)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.report(results)
+        if options['save']:
+            benchmark.save_baseline(options['save'], results, conditions)
+        if baseline is not None:
+            regressions = benchmark.compare(
+                results, baseline['results'], options['tolerance']
+            )
+            if regressions:
+                raise CommandError(
+                    'Регрессии:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
+
+    def report(self, results):
+        columns = ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'queries',
+                   'memory_kb')
+        self.stdout.write(
+            f'{"endpoint":<24}' + ''.join(f'{name:>11}' for name in columns)
+        )
+        for name, metrics in results.items():
+            self.stdout.write(f'{name:<24}' + ''.join(
+                f'{metrics[column]:>11}' for column in columns
+            ))
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import images
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, на которые больше не ссылается ни один '
+        'пост, вместе с их миниатюрами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float,
+            default=settings.POSTS_MEDIA_GRACE_HOURS,
+            help='Не трогать файлы, которые использовались позже.',
+        )
+        parser.add_argument(
+            '--recount', action='store_true',
+            help='Сначала пересчитать ссылки по таблице постов.',
+        )
+        parser.add_argument(
+            '--scan', action='store_true',
+            help='Проверить и файлы, которых нет в таблице ссылок.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.',
+        )
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            images.recount_files()
+        deleted = images.collect_garbage(
+            timedelta(hours=options['grace_hours']),
+            scan=options['scan'],
+            dry_run=options['dry_run'],
+        )
+        for name in deleted:
+            self.stdout.write(name)
+        verb = 'К удалению' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {len(deleted)}.'
+        ))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Выгружает таблицу в JSON Lines или CSV, не держа ее в памяти.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=tuple(transfer.MODELS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=transfer.FORMATS)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Дописать файл, начиная после его последней строки.',
+        )
+
+    def handle(self, *args, **options):
+        model, fields = transfer.MODELS[options['model']]
+        path = options['path']
+        file_format = options['format'] or transfer.guess_format(path)
+        after_id = 0
+        if options['resume']:
+            after_id = transfer.last_exported_id(path, file_format)
+        started = time.monotonic()
+        count = 0
+        with open(path, 'a' if after_id else 'w', encoding='utf-8',
+                  newline='') as file:
+            writer = transfer.WRITERS[file_format](
+                file, fields, append=bool(after_id)
+            )
+            for row in transfer.export_rows(
+                model, fields, after_id, options['chunk_size']
+            ):
+                writer.write(row)
+                count += 1
+                if count % (options['chunk_size'] * 10) == 0:
+                    self.report(count, started)
+        self.report(count, started, self.style.SUCCESS)
+
+    def report(self, count, started, style=str):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(style(
+            f'Выгружено строк: {count}, {count / elapsed:.0f} в секунду.'
+        ))
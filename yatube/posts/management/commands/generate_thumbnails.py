@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections
+from sorl.thumbnail import default
+
+from posts.thumbnails import PregeneratedThumbnailBackend, generate, presets
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+def walk(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            yield f'{path}/{name}'
+    for directory in directories:
+        yield from walk(storage, f'{path}/{directory}')
+
+
+class Command(BaseCommand):
+    help = 'Создает недостающие миниатюры для картинок из media/posts/.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='posts')
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        if not default_storage.exists(options['path']):
+            self.stdout.write('Картинок нет.')
+            return
+        backend = PregeneratedThumbnailBackend()
+        jobs = []
+        for name in walk(default_storage, options['path']):
+            for geometry_string, thumbnail_options in presets():
+                _, thumbnail = backend.prepare(
+                    name, geometry_string, dict(thumbnail_options)
+                )
+                if not default.kvstore.get(thumbnail):
+                    jobs.append((name, geometry_string, thumbnail_options))
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                results = list(pool.map(self.generate_in_thread, jobs))
+        else:
+            results = [self.generate(job) for job in jobs]
+        created = sum(result is not None for result in results)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано миниатюр: {created} из {len(jobs)}.'
+        ))
+
+    def generate(self, job):
+        try:
+            return generate(*job)
+        except Exception as error:
+            self.stderr.write(f'{job[0]}: {error}')
+            return None
+
+    def generate_in_thread(self, job):
+        try:
+            return self.generate(job)
+        finally:
+            connections.close_all()
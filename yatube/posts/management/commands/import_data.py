@@ -0,0 +1,82 @@
+import os
+import time
+from collections import defaultdict
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает таблицу из JSON Lines или CSV пачками bulk_create. '
+        'Модели грузятся по порядку: users, groups, posts, comments, follows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=tuple(transfer.MODELS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=transfer.FORMATS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Пропустить строки, записанные прерванным запуском.',
+        )
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Не пересчитывать счетчики и популярное после загрузки.',
+        )
+
+    def handle(self, *args, **options):
+        name = options['model']
+        model, fields = transfer.MODELS[name]
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'Нет файла {path}.')
+        file_format = options['format'] or transfer.guess_format(path)
+        checkpoint = f'{path}.done'
+        done = 0
+        if options['resume'] and os.path.exists(checkpoint):
+            with open(checkpoint) as file:
+                done = int(file.read() or 0)
+        touched = defaultdict(set)
+        started = time.monotonic()
+        count = read = 0
+        conflicts = []
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = transfer.read_rows(file, file_format)
+            for _ in range(done):
+                next(rows, None)
+            for batch in transfer.import_rows(
+                model, fields, rows, options['batch_size']
+            ):
+                transfer.index_batch(name, batch.inserted)
+                transfer.collect_touched(name, batch.inserted, touched)
+                count += len(batch.inserted)
+                read += batch.rows
+                conflicts.extend(obj.pk for obj in batch.conflicts)
+                with open(checkpoint, 'w') as progress:
+                    progress.write(str(done + read))
+                if read % (options['batch_size'] * 10) == 0:
+                    self.report(count, started)
+        transfer.finish_import(name, touched)
+        if not options['no_rebuild']:
+            call_command('recount_feeds', stdout=self.stdout)
+            call_command('rebuild_popular', stdout=self.stdout)
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.report(count, started, self.style.SUCCESS)
+        if conflicts:
+            shown = ', '.join(map(str, conflicts[:20]))
+            self.stdout.write(self.style.WARNING(
+                f'Пропущено строк из-за конфликта уникальности: '
+                f'{len(conflicts)} (id: {shown}'
+                f'{", ..." if len(conflicts) > 20 else ""}).'
+            ))
+
+    def report(self, count, started, style=str):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(style(
+            f'Загружено строк: {count}, {count / elapsed:.0f} в секунду.'
+        ))
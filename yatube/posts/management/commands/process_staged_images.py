@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import images
+
+
+class Command(BaseCommand):
+    help = (
+        'Обрабатывает загрузки, оставшиеся в staging, например после '
+        'перезапуска сервера с непустой очередью.'
+    )
+
+    def handle(self, *args, **options):
+        count = 0
+        for post_id, staged in list(images.staged_images()):
+            images.process(post_id, staged)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {count}.'
+        ))
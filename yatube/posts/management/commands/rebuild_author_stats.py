@@ -0,0 +1,48 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts.models import AuthorStats, Follow, Post
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики авторов с нуля по постам и подпискам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        stats = defaultdict(dict)
+        posts = Post.objects.order_by().values('author').annotate(
+            total=Count('id')
+        ).values_list('author', 'total')
+        for author_id, total in posts.iterator():
+            stats[author_id]['posts_count'] = total
+        followers = Follow.objects.filter(
+            user__isnull=False, author__isnull=False
+        ).order_by().values('author').annotate(
+            total=Count('id')
+        ).values_list('author', 'total')
+        for author_id, total in followers.iterator():
+            stats[author_id]['followers_count'] = total
+        following = Follow.objects.filter(
+            user__isnull=False, author__isnull=False
+        ).order_by().values('user').annotate(
+            total=Count('id')
+        ).values_list('user', 'total')
+        for user_id, total in following.iterator():
+            stats[user_id]['following_count'] = total
+        with transaction.atomic():
+            AuthorStats.objects.all().delete()
+            AuthorStats.objects.bulk_create(
+                (
+                    AuthorStats(user_id=author_id, **counters)
+                    for author_id, counters in stats.items()
+                ),
+                batch_size=options['batch_size'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики пересчитаны: {len(stats)} авторов.'
+        ))
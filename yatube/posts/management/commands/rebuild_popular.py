@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import popular
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает популярность всех постов по комментариям и '
+        'подписчикам авторов и заново строит ленты популярного.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = popular.rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Популярность пересчитана: {count} постов.'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Заново строит полнотекстовый индекс постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError('Полнотекстовый индекс есть только в SQLite.')
+        total = search.reindex(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'В индексе постов: {total}.'
+        ))
@@ -0,0 +1,25 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Точно пересчитывает счетчики лент (главная, группы), '
+        'комментариев к постам и авторов. '
+        'Запускается периодически, чтобы поправить расхождения.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = counters.recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики лент пересчитаны: {total}.'
+        ))
+        total = counters.recount_comments()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики комментариев пересчитаны: {total}.'
+        ))
+        call_command('rebuild_author_stats', stdout=self.stdout)
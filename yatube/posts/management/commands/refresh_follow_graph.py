@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from posts import graph
+from posts.models import FollowSuggestion, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации подписок: авторов, на которых '
+        'подписаны подписки читателя.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=None)
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(follower__isnull=False).order_by(
+            'pk'
+        ).values_list('pk', flat=True).distinct()
+        after_id = 0
+        readers = suggestions = 0
+        while True:
+            batch = list(
+                users.filter(pk__gt=after_id)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            suggestions += graph.refresh_suggestions(batch, options['limit'])
+            readers += len(batch)
+            after_id = batch[-1]
+        # Тем, кто отписался от всех, рекомендовать больше некого.
+        FollowSuggestion.objects.exclude(user__in=users).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Рекомендации обновлены: {readers} читателей, '
+            f'{suggestions} рекомендаций.'
+        ))
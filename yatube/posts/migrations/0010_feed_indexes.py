@@ -0,0 +1,64 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:11
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def drop_duplicate_follows(apps, schema_editor):
+    """Оставляет по одной подписке с наименьшим id на пару.
+
+    До этой миграции уникальность не проверялась, и параллельные
+    get_or_create или админка могли завести повторы.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    first = Follow.objects.order_by().values('user', 'author').annotate(
+        first=Min('id')
+    ).values('first')
+    Follow.objects.filter(
+        user__isnull=False, author__isnull=False
+    ).exclude(pk__in=first).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_authorstats'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'verbose_name': 'Коментарий', 'verbose_name_plural': 'Коментарии'},
+        ),
+        migrations.AlterModelOptions(
+            name='follow',
+            options={'verbose_name': 'Подписчик', 'verbose_name_plural': 'Подписчики'},
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created', 'id'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['author', 'user'], name='follow_author_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date', '-id'], name='post_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_pub_date_idx'),
+        ),
+        migrations.RunPython(
+            drop_duplicate_follows, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique appversion'),
+        ),
+    ]
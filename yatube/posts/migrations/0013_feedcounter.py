@@ -0,0 +1,40 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:31
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_feed_counters(apps, schema_editor):
+    FeedCounter = apps.get_model('posts', 'FeedCounter')
+    Post = apps.get_model('posts', 'Post')
+    counters = [FeedCounter(feed='index', posts_count=Post.objects.count())]
+    groups = Post.objects.filter(group__isnull=False).order_by().values(
+        'group'
+    ).annotate(total=Count('id'))
+    counters.extend(
+        FeedCounter(feed=f'group:{row["group"]}', posts_count=row['total'])
+        for row in groups
+    )
+    FeedCounter.objects.bulk_create(counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedCounter',
+            fields=[
+                ('feed', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Лента')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+            ],
+            options={
+                'verbose_name': 'Счетчик ленты',
+                'verbose_name_plural': 'Счетчики лент',
+            },
+        ),
+        migrations.RunPython(fill_feed_counters, migrations.RunPython.noop),
+    ]
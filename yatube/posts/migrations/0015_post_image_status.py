@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_comments_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Готова'), ('processing', 'Обрабатывается'), ('failed', 'Не удалось обработать')], default='ready', editable=False, max_length=10, verbose_name='Состояние картинки'),
+        ),
+    ]
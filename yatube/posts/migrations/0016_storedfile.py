@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:39
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_stored_files(apps, schema_editor):
+    StoredFile = apps.get_model('posts', 'StoredFile')
+    Post = apps.get_model('posts', 'Post')
+    images = Post.objects.filter(image__startswith='posts/').order_by(
+    ).values('image').annotate(total=Count('id'))
+    StoredFile.objects.bulk_create(
+        StoredFile(name=row['image'], refcount=row['total'])
+        for row in images.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_image_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Изменен')),
+            ],
+            options={
+                'verbose_name': 'Файл',
+                'verbose_name_plural': 'Файлы',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='storedfile',
+            index=models.Index(fields=['refcount', 'updated'], name='storedfile_refcount_idx'),
+        ),
+        migrations.RunPython(fill_stored_files, migrations.RunPython.noop),
+    ]
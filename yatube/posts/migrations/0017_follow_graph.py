@@ -0,0 +1,72 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:48
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_following_count(apps, schema_editor):
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    Follow = apps.get_model('posts', 'Follow')
+    following = Follow.objects.filter(
+        user__isnull=False, author__isnull=False
+    ).order_by().values('user').annotate(total=Count('id'))
+    for row in following.iterator():
+        updated = AuthorStats.objects.filter(user_id=row['user']).update(
+            following_count=row['total']
+        )
+        if not updated:
+            AuthorStats.objects.create(
+                user_id=row['user'], following_count=row['total']
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0016_storedfile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowSuggestion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveIntegerField(verbose_name='Подписок читателя, подписанных на автора')),
+            ],
+            options={
+                'verbose_name': 'Рекомендация подписки',
+                'verbose_name_plural': 'Рекомендации подписок',
+            },
+        ),
+        migrations.AddField(
+            model_name='authorstats',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество подписок'),
+        ),
+        migrations.AddIndex(
+            model_name='authorstats',
+            index=models.Index(fields=['-followers_count', 'user'], name='stats_followers_idx'),
+        ),
+        migrations.AddField(
+            model_name='followsuggestion',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Предлагаемый автор'),
+        ),
+        migrations.AddField(
+            model_name='followsuggestion',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follow_suggestions', to=settings.AUTH_USER_MODEL, verbose_name='Читатель'),
+        ),
+        migrations.AddIndex(
+            model_name='followsuggestion',
+            index=models.Index(fields=['user', '-score', 'author'], name='suggestion_user_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='followsuggestion',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow_suggestion'),
+        ),
+        migrations.RunPython(fill_following_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:50
+
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Формулы posts.popular на момент миграции: код приложения может
+# измениться, а миграция должна считать как в день написания.
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+BATCH_SIZE = 500
+
+
+def fill_popular(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    PopularPost = apps.get_model('posts', 'PopularPost')
+    tau = settings.POPULAR_HALF_LIFE_HOURS * 3600 / math.log(2)
+    weights = settings.POPULAR_WEIGHTS
+
+    def event_score(weight, when):
+        return math.log(weight) + (when - EPOCH).total_seconds() / tau
+
+    last_id = 0
+    while True:
+        rows = list(Post.objects.filter(pk__gt=last_id).order_by(
+            'pk'
+        ).values_list('pk', 'author_id', 'pub_date')[:BATCH_SIZE])
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        followers = dict(AuthorStats.objects.filter(
+            user_id__in={author_id for _, author_id, _ in rows}
+        ).values_list('user_id', 'followers_count'))
+        scores = {
+            pk: event_score(weights['post'], pub_date) + (
+                weights['followers']
+                * math.log1p(followers.get(author_id, 0))
+            )
+            for pk, author_id, pub_date in rows
+        }
+        for post_id, created in Comment.objects.filter(
+            post_id__in=list(scores)
+        ).values_list('post_id', 'created'):
+            event = event_score(weights['comment'], created)
+            high, low = max(scores[post_id], event), min(
+                scores[post_id], event
+            )
+            scores[post_id] = high + math.log1p(math.exp(low - high))
+        Post.objects.bulk_update(
+            [Post(pk=pk, popularity=score) for pk, score in scores.items()],
+            ['popularity'],
+        )
+    groups = Post.objects.filter(group__isnull=False).order_by().values_list(
+        'group_id', flat=True
+    ).distinct()
+    feeds = [('index', Post.objects.all())] + [
+        (f'group:{group_id}', Post.objects.filter(group_id=group_id))
+        for group_id in list(groups)
+    ]
+    for feed, posts in feeds:
+        PopularPost.objects.bulk_create(
+            (
+                PopularPost(feed=feed, post_id=pk, score=score)
+                for pk, score in posts.order_by(
+                    '-popularity', '-pk'
+                ).values_list('pk', 'popularity')[:settings.POPULAR_TOP]
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_follow_graph'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='popularity',
+            field=models.FloatField(default=0.0, editable=False, help_text='Логарифм затухающей оценки, см. posts.popular', verbose_name='Популярность'),
+        ),
+        migrations.CreateModel(
+            name='PopularPost',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('feed', models.CharField(max_length=100, verbose_name='Лента')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='popular_entries', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Популярный пост',
+                'verbose_name_plural': 'Популярные посты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='popularpost',
+            index=models.Index(fields=['feed', '-score', '-post'], name='popular_feed_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='popularpost',
+            constraint=models.UniqueConstraint(fields=('feed', 'post'), name='unique_popular_post'),
+        ),
+        migrations.RunPython(fill_popular, migrations.RunPython.noop),
+    ]
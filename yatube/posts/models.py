@@ -1,4 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -28,7 +31,21 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """Посты для лент: автор и группа одним запросом, без лишних полей."""
+        return self.select_related('author', 'group').only(
+            'text', 'pub_date', 'image',
+            'author', 'author__username',
+            'group', 'group__title', 'group__slug',
+        )
+
+
 class Post(models.Model):
+    IMAGE_READY = 'ready'
+    IMAGE_PROCESSING = 'processing'
+    IMAGE_FAILED = 'failed'
+
     text = models.TextField(
         verbose_name='Текст поста',
         help_text='Текст нового поста'
@@ -58,9 +75,41 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    image_status = models.CharField(
+        'Состояние картинки',
+        max_length=10,
+        choices=(
+            (IMAGE_READY, 'Готова'),
+            (IMAGE_PROCESSING, 'Обрабатывается'),
+            (IMAGE_FAILED, 'Не удалось обработать'),
+        ),
+        default=IMAGE_READY,
+        editable=False,
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев',
+    )
+    popularity = models.FloatField(
+        default=0.0,
+        editable=False,
+        verbose_name='Популярность',
+        help_text='Логарифм затухающей оценки, см. posts.popular',
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(fields=('-pub_date', '-id'),
+                         name='post_pub_date_idx'),
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=('group', '-pub_date', '-id'),
+                         name='post_group_pub_date_idx'),
+        )
         verbose_name = 'Пост'
         verbose_name_plural = "Посты"
 
@@ -98,6 +147,10 @@ class Comment(models.Model):
     )
 
     class Meta:
+        indexes = (
+            models.Index(fields=('post', 'created', 'id'),
+                         name='comment_post_created_idx'),
+        )
         verbose_name = 'Коментарий'
         verbose_name_plural = 'Коментарии'
 
@@ -126,10 +179,251 @@ class Follow(models.Model):
     class Meta:
         constraints = (
             models.UniqueConstraint(fields=('user', 'author',),
-                                    name='unique appversion')
+                                    name='unique appversion'),
+        )
+        indexes = (
+            models.Index(fields=('author', 'user'),
+                         name='follow_author_user_idx'),
         )
         verbose_name = 'Подписчик'
         verbose_name_plural = 'Подписчики'
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+class AuthorStatsQuerySet(models.QuerySet):
+    def increment(self, user_id, **deltas):
+        """Атомарно сдвигает счетчики автора, создавая строку при нужде.
+
+        Уменьшение строку не создает: ее нет либо у автора без счетчиков,
+        либо у пользователя, который удаляется каскадом прямо сейчас.
+        """
+        with transaction.atomic():
+            updated = self.filter(user_id=user_id).update(**{
+                field: Greatest(F(field) + delta, 0)
+                for field, delta in deltas.items()
+            })
+            if not updated and all(delta > 0 for delta in deltas.values()):
+                self.create(user_id=user_id, **deltas)
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Автор',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписок',
+    )
+
+    objects = AuthorStatsQuerySet.as_manager()
+
+    class Meta:
+        indexes = (
+            models.Index(fields=('-followers_count', 'user'),
+                         name='stats_followers_idx'),
+        )
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    def __str__(self):
+        return f'{self.user}: {self.posts_count} постов'
+
+    @classmethod
+    def for_user(cls, user):
+        """Счетчики пользователя; для авторов без постов - нулевые."""
+        try:
+            return user.stats
+        except cls.DoesNotExist:
+            return cls(user=user)
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'post'),
+                                    name='unique_timeline_post'),
+        )
+        indexes = (
+            models.Index(fields=('user', '-pub_date', '-id'),
+                         name='timeline_user_pub_date_idx'),
+            models.Index(fields=('user', 'author'),
+                         name='timeline_user_author_idx'),
+        )
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+
+    def __str__(self):
+        return f'{self.post} в ленте {self.user}'
+
+
+class FollowSuggestion(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions',
+        verbose_name='Читатель',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Предлагаемый автор',
+    )
+    score = models.PositiveIntegerField(
+        verbose_name='Подписок читателя, подписанных на автора',
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'author'),
+                                    name='unique_follow_suggestion'),
+        )
+        indexes = (
+            models.Index(fields=('user', '-score', 'author'),
+                         name='suggestion_user_score_idx'),
+        )
+        verbose_name = 'Рекомендация подписки'
+        verbose_name_plural = 'Рекомендации подписок'
+
+    def __str__(self):
+        return f'{self.author} для {self.user}'
+
+
+class FeedCounterQuerySet(models.QuerySet):
+    def increment(self, feed, delta):
+        """Атомарно сдвигает счетчик ленты, если его строка уже есть.
+
+        Строку не создает: сколько постов в ленте было до сдвига,
+        неизвестно, а без строки counters.feed_count посчитает ленту
+        честно при первом чтении.
+        """
+        self.filter(feed=feed).update(
+            posts_count=Greatest(F('posts_count') + delta, 0)
+        )
+
+
+class FeedCounter(models.Model):
+    feed = models.CharField(
+        max_length=100,
+        primary_key=True,
+        verbose_name='Лента',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов',
+    )
+
+    objects = FeedCounterQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Счетчик ленты'
+        verbose_name_plural = 'Счетчики лент'
+
+    def __str__(self):
+        return f'{self.feed}: {self.posts_count} постов'
+
+
+class PopularPost(models.Model):
+    feed = models.CharField(
+        max_length=100,
+        verbose_name='Лента',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='popular_entries',
+        verbose_name='Пост',
+    )
+    score = models.FloatField(verbose_name='Оценка')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=('feed', 'post'),
+                                    name='unique_popular_post'),
+        )
+        indexes = (
+            models.Index(fields=('feed', '-score', '-post'),
+                         name='popular_feed_score_idx'),
+        )
+        verbose_name = 'Популярный пост'
+        verbose_name_plural = 'Популярные посты'
+
+    def __str__(self):
+        return f'{self.post} в {self.feed}'
+
+
+class StoredFileQuerySet(models.QuerySet):
+    def increment(self, name, delta):
+        """Атомарно сдвигает число ссылок на файл."""
+        with transaction.atomic():
+            updated = self.filter(name=name).update(
+                refcount=Greatest(F('refcount') + delta, 0),
+                updated=timezone.now(),
+            )
+            if not updated:
+                self.create(name=name, refcount=max(delta, 0))
+
+
+class StoredFile(models.Model):
+    """Файл из хранилища по содержимому и число постов, его использующих."""
+
+    name = models.CharField(
+        max_length=255,
+        primary_key=True,
+        verbose_name='Файл',
+    )
+    refcount = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число ссылок',
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Изменен',
+    )
+
+    objects = StoredFileQuerySet.as_manager()
+
+    class Meta:
+        indexes = (
+            models.Index(fields=('refcount', 'updated'),
+                         name='storedfile_refcount_idx'),
+        )
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return f'{self.name}: {self.refcount}'
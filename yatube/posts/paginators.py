@@ -0,0 +1,216 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+FORWARD = 'n'
+BACKWARD = 'p'
+# Граница 64-битного INTEGER: большие числа база не примет.
+MAX_INT = 2 ** 63
+
+
+def encode_cursor(direction, values):
+    raw = json.dumps([direction, [
+        value.isoformat() if isinstance(value, (date, datetime)) else value
+        for value in values
+    ]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def object_cursor(direction, obj, fields):
+    """Курсор от объекта obj по значениям полей fields."""
+    return encode_cursor(direction, [getattr(obj, name) for name in fields])
+
+
+def decode_cursor(cursor):
+    """Возвращает (направление, значения) или None для битого курсора."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if direction not in (FORWARD, BACKWARD) or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+class ElidedPaginator(Paginator):
+    """Paginator со списком страниц ограниченной длины.
+
+    get_page кладет в страницу elided_page_range: первые и последние
+    номера и окно вокруг текущего, пропуски заменены на ELLIPSIS.
+    Сама страница остается обычной Page.
+
+    count - необязательная функция без аргументов, которая возвращает
+    размер набора вместо COUNT(*), например из счетчика.
+
+    ordering - порядок keyset-пагинации набора. Если он задан, набор
+    сортируется по нему, а страница получает keyset_cursor: ссылка
+    "Следующая" ведет в режим курсоров и не платит за OFFSET на глубоких
+    страницах.
+    """
+
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, count=None, ordering=None,
+                 **kwargs):
+        if ordering:
+            # Тот же полный порядок, что и у курсоров: иначе посты с
+            # одинаковой датой теряются на переходе в режим курсоров.
+            object_list = object_list.order_by(*ordering)
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_provider = count
+        self.ordering = ordering
+
+    @cached_property
+    def count(self):
+        if self.count_provider is None:
+            return super().count
+        return self.count_provider()
+
+    def get_elided_page_range(self, number=1, on_each_side=3, on_ends=2):
+        # Та же логика, что у Paginator.get_elided_page_range в Django 3.2.
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > (1 + on_each_side + on_ends) + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < (self.num_pages - on_each_side - on_ends) - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1, self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+    def get_page(self, number):
+        page = super().get_page(number)
+        page.elided_page_range = list(
+            self.get_elided_page_range(page.number)
+        )
+        page.keyset_cursor = None
+        if self.ordering and page.has_next():
+            page.keyset_cursor = object_cursor(
+                FORWARD, page[len(page) - 1],
+                [name.lstrip('-') for name in self.ordering],
+            )
+        return page
+
+
+class CursorPage(Page):
+    """Страница keyset-пагинации: без номера и без общего числа страниц."""
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset (seek) пагинация по упорядоченному набору полей.
+
+    Вместо COUNT(*) и OFFSET выбирается per_page + 1 строк после
+    (или до) значений ключа из курсора, поэтому стоимость любой
+    страницы одинакова. Последнее поле ordering должно быть уникальным.
+    """
+
+    ORDERING = ('-pub_date', '-id')
+
+    def __init__(self, object_list, per_page, ordering=None):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering or self.ORDERING)
+        self.fields = tuple(name.lstrip('-') for name in self.ordering)
+
+    def _to_python(self, values):
+        model = self.object_list.model
+        if len(values) != len(self.fields):
+            raise ValidationError('Неверная длина курсора.')
+        result = []
+        for name, value in zip(self.fields, values):
+            if isinstance(value, bool) or not isinstance(value, (str, int)):
+                raise ValidationError('Неверное значение курсора.')
+            field = model._meta.get_field(name)
+            value = field.to_python(value)
+            if value is None:
+                raise ValidationError('Пустое значение курсора.')
+            if isinstance(value, int) and not -MAX_INT <= value < MAX_INT:
+                raise ValidationError('Значение курсора вне диапазона.')
+            field.run_validators(value)
+            result.append(value)
+        return result
+
+    def _seek(self, values, direction):
+        # Условие на первое поле дает диапазон по индексу, остальное -
+        # уточнение внутри него; чистое OR индекс не использует.
+        first_descending = self.ordering[0].startswith('-')
+        bound = 'lte' if first_descending == (direction == FORWARD) else 'gte'
+        condition = Q()
+        for position, name in enumerate(self.ordering):
+            descending = name.startswith('-')
+            lookup = 'lt' if descending == (direction == FORWARD) else 'gt'
+            step = Q(**{
+                f'{self.fields[position]}__{lookup}': values[position]
+            })
+            for field, value in zip(self.fields[:position], values):
+                step &= Q(**{field: value})
+            condition |= step
+        return Q(**{f'{self.fields[0]}__{bound}': values[0]}) & condition
+
+    def _reversed_ordering(self):
+        return tuple(
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        )
+
+    def _cursor(self, direction, obj):
+        return object_cursor(direction, obj, self.fields)
+
+    def get_page(self, cursor=None):
+        decoded = decode_cursor(cursor) if cursor else None
+        direction, values = FORWARD, None
+        if decoded is not None:
+            try:
+                direction, values = decoded[0], self._to_python(decoded[1])
+            except (ValidationError, LookupError, TypeError, ValueError):
+                direction, values = FORWARD, None
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, direction))
+        if direction == FORWARD:
+            queryset = queryset.order_by(*self.ordering)
+        else:
+            queryset = queryset.order_by(*self._reversed_ordering())
+        items = list(queryset[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if direction == BACKWARD:
+            items.reverse()
+        next_cursor = previous_cursor = None
+        if items:
+            if direction == BACKWARD or has_more:
+                next_cursor = self._cursor(FORWARD, items[-1])
+            if values is not None and (direction == FORWARD or has_more):
+                previous_cursor = self._cursor(BACKWARD, items[0])
+        return CursorPage(items, self, next_cursor, previous_cursor)
@@ -0,0 +1,215 @@
+"""Популярные посты: затухающая оценка, которая обновляется по событиям.
+
+Каждое событие (публикация, комментарий, новый подписчик автора)
+добавляет вес, который затухает вдвое за POPULAR_HALF_LIFE_HOURS.
+Хранится логарифм суммы весов, приведенных к общему началу отсчета
+EPOCH:
+
+    popularity = log(sum(weight * exp((time - EPOCH) / tau)))
+
+Сравнение таких чисел совпадает со сравнением оценок на любой момент,
+поэтому старые строки не нужно пересчитывать со временем, а новое
+событие - это одно logaddexp. Лучшие POPULAR_TOP постов общей ленты и
+каждой группы лежат в PopularPost, из нее и читается /popular/.
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from posts import counters
+from posts.models import AuthorStats, Comment, PopularPost, Post
+
+EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def tau():
+    return settings.POPULAR_HALF_LIFE_HOURS * 3600 / math.log(2)
+
+
+def event_score(weight, when):
+    """Логарифм веса события, приведенный к EPOCH."""
+    return math.log(weight) + (when - EPOCH).total_seconds() / tau()
+
+
+def logaddexp(first, second):
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def decayed(popularity, now=None):
+    """Оценка на момент now - для показа и отладки."""
+    now = now or timezone.now()
+    return math.exp(popularity - (now - EPOCH).total_seconds() / tau())
+
+
+def base_score(pub_date, followers):
+    """Публикация: вес поста, больше у авторов с подписчиками."""
+    weights = settings.POPULAR_WEIGHTS
+    return event_score(weights['post'], pub_date) + (
+        weights['followers'] * math.log1p(followers)
+    )
+
+
+def feeds(group_id):
+    result = [counters.index_feed()]
+    if group_id:
+        result.append(counters.group_feed(group_id))
+    return result
+
+
+def threshold(feed):
+    """Оценка последнего места в ленте или None, если лента не полна."""
+    return PopularPost.objects.filter(feed=feed).order_by(
+        '-score', '-post_id'
+    ).values_list('score', flat=True)[
+        settings.POPULAR_TOP - 1:settings.POPULAR_TOP
+    ].first()
+
+
+def trim(feed):
+    extra = list(PopularPost.objects.filter(feed=feed).order_by(
+        '-score', '-post_id'
+    ).values_list('pk', flat=True)[settings.POPULAR_TOP:])
+    if extra:
+        PopularPost.objects.filter(pk__in=extra).delete()
+
+
+def store(post_id, group_id, popularity):
+    """Записывает оценку поста и обновляет его места в лентах."""
+    Post.objects.filter(pk=post_id).update(popularity=popularity)
+    PopularPost.objects.filter(post_id=post_id).update(score=popularity)
+    present = set(PopularPost.objects.filter(
+        post_id=post_id
+    ).values_list('feed', flat=True))
+    for feed in feeds(group_id):
+        if feed in present:
+            continue
+        lowest = threshold(feed)
+        if lowest is not None and popularity <= lowest:
+            continue
+        PopularPost.objects.bulk_create(
+            [PopularPost(feed=feed, post_id=post_id, score=popularity)],
+            ignore_conflicts=True,
+        )
+        trim(feed)
+
+
+def add_event(post_id, weight, when=None):
+    """Добавляет посту событие с весом weight."""
+    when = when or timezone.now()
+    with transaction.atomic():
+        row = Post.objects.filter(pk=post_id).values_list(
+            'popularity', 'group_id'
+        ).first()
+        if row is None:
+            return
+        popularity, group_id = row
+        store(
+            post_id, group_id,
+            logaddexp(popularity, event_score(weight, when)),
+        )
+
+
+def add_post(post):
+    stats = AuthorStats.objects.filter(user_id=post.author_id).first()
+    followers = stats.followers_count if stats else 0
+    with transaction.atomic():
+        store(post.pk, post.group_id, base_score(post.pub_date, followers))
+
+
+def add_comment(comment):
+    add_event(
+        comment.post_id, settings.POPULAR_WEIGHTS['comment'], comment.created
+    )
+
+
+def add_follow(author_id):
+    """Новый подписчик поднимает последние посты автора."""
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('pk', flat=True)[:settings.POPULAR_FOLLOW_POSTS]
+    now = timezone.now()
+    for post_id in list(posts):
+        add_event(post_id, settings.POPULAR_WEIGHTS['follow'], now)
+
+
+def move(post, old_group_id):
+    """Пост сменил группу: место в старой ленте группы ему не нужно."""
+    with transaction.atomic():
+        if old_group_id:
+            PopularPost.objects.filter(
+                feed=counters.group_feed(old_group_id), post_id=post.pk
+            ).delete()
+        popularity = Post.objects.filter(pk=post.pk).values_list(
+            'popularity', flat=True
+        ).first()
+        if popularity is not None:
+            store(post.pk, post.group_id, popularity)
+
+
+def rebuild(batch_size=1000):
+    """Считает оценки всех постов с нуля и заново строит ленты.
+
+    Подписки не хранят даты, поэтому при пересчете подписчики автора
+    учитываются только в весе публикации.
+    """
+    followers = dict(AuthorStats.objects.values_list(
+        'user_id', 'followers_count'
+    ).iterator())
+    scores = {}
+    groups = {}
+    for post_id, author_id, group_id, pub_date in (
+        Post.objects.order_by().values_list(
+            'pk', 'author_id', 'group_id', 'pub_date'
+        ).iterator()
+    ):
+        scores[post_id] = base_score(pub_date, followers.get(author_id, 0))
+        groups[post_id] = group_id
+    weight = settings.POPULAR_WEIGHTS['comment']
+    for post_id, created in Comment.objects.filter(
+        post__isnull=False
+    ).order_by().values_list('post_id', 'created').iterator():
+        scores[post_id] = logaddexp(
+            scores[post_id], event_score(weight, created)
+        )
+    top = {}
+    for post_id, popularity in scores.items():
+        for feed in feeds(groups[post_id]):
+            top.setdefault(feed, []).append((popularity, post_id))
+    with transaction.atomic():
+        Post.objects.bulk_update(
+            (
+                Post(pk=post_id, popularity=popularity)
+                for post_id, popularity in scores.items()
+            ),
+            ('popularity',),
+            batch_size=batch_size,
+        )
+        PopularPost.objects.all().delete()
+        PopularPost.objects.bulk_create(
+            (
+                PopularPost(feed=feed, post_id=post_id, score=popularity)
+                for feed, entries in top.items()
+                for popularity, post_id in sorted(
+                    entries, reverse=True
+                )[:settings.POPULAR_TOP]
+            ),
+            batch_size=batch_size,
+        )
+    return len(scores)
+
+
+def popular_posts(group=None):
+    """Посты ленты популярного в порядке оценки."""
+    feed = counters.group_feed(group.pk) if group else counters.index_feed()
+    return Post.objects.feed().filter(popular_entries__feed=feed).order_by(
+        '-popular_entries__score', '-pk'
+    )
+
+
+def popular_count(group=None):
+    feed = counters.group_feed(group.pk) if group else counters.index_feed()
+    return PopularPost.objects.filter(feed=feed).count()
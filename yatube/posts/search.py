@@ -0,0 +1,187 @@
+import re
+
+from django.db import connection
+
+from posts.models import Post
+
+TABLE = 'posts_post_search'
+
+WORD = re.compile(r'\w+')
+CYRILLIC = re.compile(r'^[а-я]+$')
+VOWELS = 'аеиоуыэюя'
+
+# Окончания стеммера Портера для русского языка (Snowball).
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|'
+    r'их|ых|ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|'
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|'
+    r'ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile(
+    r'[^аеиоуыэюя][аеиоуыэюя]+[^аеиоуыэюя]+[аеиоуыэюя].*(?<=о)сть?$'
+)
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+
+def stem(word):
+    """Основа русского слова по алгоритму Портера."""
+    word = word.lower().replace('ё', 'е')
+    start = next(
+        (index + 1 for index, char in enumerate(word) if char in VOWELS),
+        None,
+    )
+    if start is None:
+        return word
+    head, rv = word[:start], word[start:]
+    stripped = PERFECTIVE_GERUND.sub('', rv, 1)
+    if stripped == rv:
+        rv = REFLEXIVE.sub('', rv, 1)
+        stripped = ADJECTIVE.sub('', rv, 1)
+        if stripped != rv:
+            stripped = PARTICIPLE.sub('', stripped, 1)
+        else:
+            stripped = VERB.sub('', rv, 1)
+            if stripped == rv:
+                stripped = NOUN.sub('', rv, 1)
+    rv = stripped
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if DERIVATIONAL.search(rv):
+        rv = re.sub(r'ость?$', '', rv)
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = SUPERLATIVE.sub('', rv, 1)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return head + rv
+
+
+def terms(text):
+    """Слова текста в том виде, в каком они лежат в индексе."""
+    result = []
+    for word in WORD.findall(text.lower().replace('ё', 'е')):
+        result.append(stem(word) if CYRILLIC.match(word) else word)
+    return result
+
+
+def is_supported():
+    return connection.vendor == 'sqlite'
+
+
+def index_post(post):
+    if is_supported():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {TABLE} (rowid, body) '
+                'VALUES (%s, %s)',
+                [post.pk, ' '.join(terms(post.text))],
+            )
+
+
+def remove_post(post_id):
+    if is_supported():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def reindex(posts=None, batch_size=1000):
+    """Заново строит индекс по постам; возвращает их число."""
+    if not is_supported():
+        return 0
+    total = 0
+    rows = []
+    with connection.cursor() as cursor:
+        if posts is None:
+            posts = Post.objects.all()
+            cursor.execute(f'DELETE FROM {TABLE}')
+        for pk, text in posts.order_by().values_list('pk', 'text').iterator():
+            rows.append((pk, ' '.join(terms(text))))
+            if len(rows) >= batch_size:
+                total += insert_rows(cursor, rows)
+        total += insert_rows(cursor, rows)
+    return total
+
+
+def insert_rows(cursor, rows):
+    count = len(rows)
+    if rows:
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {TABLE} (rowid, body) VALUES (%s, %s)',
+            rows,
+        )
+        rows.clear()
+    return count
+
+
+def match_expression(query):
+    """Запрос FTS5: все слова должны встретиться, операторы не работают."""
+    return ' '.join(f'"{term}"' for term in terms(query))
+
+
+def filter_matching(queryset, query):
+    """Оставляет в наборе постов только подходящие под запрос."""
+    return queryset.extra(
+        where=[
+            f'{Post._meta.db_table}.id IN '
+            f'(SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s)'
+        ],
+        params=[match_expression(query)],
+    )
+
+
+class SearchResults:
+    """Результаты поиска для Paginator: новые посты первыми.
+
+    Страница и общее число берутся прямо из индекса FTS5, который
+    хранит документы по rowid = id поста, поэтому ORDER BY rowid DESC
+    с LIMIT не сортирует все совпадения.
+    """
+
+    def __init__(self, query):
+        self.match = match_expression(query)
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = 0
+            if self.match and is_supported():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'SELECT count(*) FROM {TABLE} '
+                        f'WHERE {TABLE} MATCH %s',
+                        [self.match],
+                    )
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if not self.match or not is_supported() or stop <= start:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s '
+                'ORDER BY rowid DESC LIMIT %s OFFSET %s',
+                [self.match, stop - start, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = Post.objects.feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
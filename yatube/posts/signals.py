@@ -0,0 +1,291 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from core.storage import is_content_addressed
+from posts import (
+    caching, counters, follows, popular, search, thumbnails, timeline
+)
+from posts.models import (
+    AuthorStats, Comment, FeedCounter, Follow, Group, Post, StoredFile, User
+)
+
+
+def invalidate(*scopes):
+    # Второй сдвиг после коммита не дает закэшировать страницу, которую
+    # параллельный запрос успел построить до фиксации изменений.
+    caching.bump(*scopes)
+    transaction.on_commit(lambda: caching.bump(*scopes))
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, **kwargs):
+    instance._old_author_id = instance._old_group_id = None
+    instance._old_image = None
+    if instance.pk is not None:
+        old = Post.objects.filter(pk=instance.pk).values_list(
+            'author_id', 'group_id', 'image'
+        ).first()
+        if old is not None:
+            (instance._old_author_id, instance._old_group_id,
+             instance._old_image) = old
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    old_author_id = getattr(instance, '_old_author_id', None)
+    if created:
+        AuthorStats.objects.increment(instance.author_id, posts_count=1)
+    elif old_author_id and old_author_id != instance.author_id:
+        AuthorStats.objects.increment(old_author_id, posts_count=-1)
+        AuthorStats.objects.increment(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    AuthorStats.objects.increment(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def count_feed_post(sender, instance, created, **kwargs):
+    old_group_id = getattr(instance, '_old_group_id', None)
+    if created:
+        FeedCounter.objects.increment(counters.index_feed(), 1)
+    elif old_group_id == instance.group_id:
+        return
+    elif old_group_id:
+        FeedCounter.objects.increment(counters.group_feed(old_group_id), -1)
+    if instance.group_id:
+        FeedCounter.objects.increment(
+            counters.group_feed(instance.group_id), 1
+        )
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_feed_post(sender, instance, **kwargs):
+    FeedCounter.objects.increment(counters.index_feed(), -1)
+    if instance.group_id:
+        FeedCounter.objects.increment(
+            counters.group_feed(instance.group_id), -1
+        )
+
+
+@receiver(post_delete, sender=Group)
+def drop_group_counter(sender, instance, **kwargs):
+    FeedCounter.objects.filter(
+        feed=counters.group_feed(instance.pk)
+    ).delete()
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def count_dropped_timeline_post(sender, instance, **kwargs):
+    timeline.drop_post(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def drop_timeline_counter(sender, instance, **kwargs):
+    FeedCounter.objects.filter(
+        feed=counters.timeline_feed(instance.pk)
+    ).delete()
+
+
+def saves_image(update_fields):
+    """Сохранение без image не меняет картинку, даже если она устарела."""
+    return update_fields is None or 'image' in update_fields
+
+
+@receiver(post_save, sender=Post)
+def generate_thumbnails(sender, instance, update_fields, **kwargs):
+    # Файл уже лежит в хранилище, поэтому коммита можно не ждать.
+    if not saves_image(update_fields):
+        return
+    image = instance.image.name
+    if image and image != getattr(instance, '_old_image', None):
+        thumbnails.schedule_all(image)
+
+
+def count_file_reference(name, delta):
+    if is_content_addressed(name):
+        StoredFile.objects.increment(name, delta)
+
+
+@receiver(post_save, sender=Post)
+def count_image_reference(sender, instance, update_fields, **kwargs):
+    if not saves_image(update_fields):
+        return
+    old_image = getattr(instance, '_old_image', None) or ''
+    image = instance.image.name or ''
+    if image != old_image:
+        count_file_reference(image, 1)
+        count_file_reference(old_image, -1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_image_reference(sender, instance, **kwargs):
+    count_file_reference(instance.image.name, -1)
+
+
+@receiver(post_save, sender=Post)
+def rank_saved_post(sender, instance, created, **kwargs):
+    old_group_id = getattr(instance, '_old_group_id', None)
+    if created:
+        popular.add_post(instance)
+    elif old_group_id != instance.group_id:
+        popular.move(instance, old_group_id)
+
+
+@receiver(post_save, sender=Comment)
+def rank_comment(sender, instance, created, **kwargs):
+    if created and instance.post_id:
+        popular.add_comment(instance)
+
+
+@receiver(post_save, sender=Follow)
+def rank_follow(sender, instance, created, **kwargs):
+    if created and instance.user_id and instance.author_id:
+        popular.add_follow(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created and instance.user_id and instance.author_id:
+        AuthorStats.objects.increment(instance.author_id, followers_count=1)
+        AuthorStats.objects.increment(instance.user_id, following_count=1)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def count_unfollow(sender, instance, **kwargs):
+    if instance.user_id and instance.author_id:
+        AuthorStats.objects.increment(instance.author_id, followers_count=-1)
+        AuthorStats.objects.increment(instance.user_id, following_count=-1)
+        timeline.prune(instance.user_id, instance.author_id)
+        timeline.unfollowed(instance.author_id)
+
+
+def post_scopes(post):
+    return [caching.index_scope(), *caching.post_scopes(post)]
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post(sender, instance, created, **kwargs):
+    scopes = post_scopes(instance)
+    old_author_id = getattr(instance, '_old_author_id', None)
+    if old_author_id and old_author_id != instance.author_id:
+        scopes.extend(
+            caching.author_scope(username) for username in
+            User.objects.filter(pk=old_author_id).values_list(
+                'username', flat=True
+            )
+        )
+    old_group_id = getattr(instance, '_old_group_id', None)
+    if old_group_id and old_group_id != instance.group_id:
+        scopes.extend(
+            caching.group_scope(slug) for slug in
+            Group.objects.filter(pk=old_group_id).values_list(
+                'slug', flat=True
+            )
+        )
+    invalidate(*scopes)
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    invalidate(*post_scopes(instance))
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, **kwargs):
+    instance._old_slug = None
+    if instance.pk is not None:
+        instance._old_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+def group_author_scopes(group_id):
+    """Профили авторов группы показывают ее название в постах."""
+    return [
+        caching.author_scope(username) for username in
+        User.objects.filter(posts__group_id=group_id).values_list(
+            'username', flat=True
+        ).distinct()
+    ]
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_authors(sender, instance, **kwargs):
+    # После удаления посты уже отвязаны от группы.
+    instance._author_scopes = group_author_scopes(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    scopes = [caching.index_scope(), caching.group_scope(instance.slug)]
+    old_slug = getattr(instance, '_old_slug', None)
+    if old_slug and old_slug != instance.slug:
+        scopes.append(caching.group_scope(old_slug))
+    author_scopes = getattr(instance, '_author_scopes', None)
+    if author_scopes is None:
+        author_scopes = group_author_scopes(instance.pk)
+    invalidate(*scopes, *author_scopes)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created and instance.post_id:
+        Post.objects.filter(pk=instance.post_id).update(
+            comments_count=F('comments_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id:
+        Post.objects.filter(pk=instance.post_id).update(
+            comments_count=Greatest(F('comments_count') - 1, 0)
+        )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(sender, instance, **kwargs):
+    if instance.post_id:
+        invalidate(caching.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, **kwargs):
+    if instance.user_id:
+        # Счетчики подписок и подписчиков выводятся на страницах обоих.
+        invalidate(caching.follow_scope(instance.user_id), *(
+            caching.author_scope(username) for username in
+            User.objects.filter(
+                pk__in=(instance.user_id, instance.author_id)
+            ).values_list('username', flat=True)
+        ))
+        user_id = instance.user_id
+        follows.invalidate(user_id)
+        transaction.on_commit(lambda: follows.invalidate(user_id))
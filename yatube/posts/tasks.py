@@ -0,0 +1,63 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+_pending_lock = threading.Lock()
+_worker = threading.local()
+
+
+def _init_worker():
+    _worker.active = True
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POSTS_BACKGROUND_WORKERS,
+                thread_name_prefix='posts-worker',
+                initializer=_init_worker,
+            )
+    return _executor
+
+
+def _run(key, func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s упала', key)
+    finally:
+        with _pending_lock:
+            _pending.discard(key)
+        # Соединения потока пула больше никто не закроет. Задача, которая
+        # выполнилась прямо в запросе, закрывать их не должна: запрос
+        # может быть посреди транзакции.
+        if getattr(_worker, 'active', False):
+            connections.close_all()
+
+
+def submit(key, func, *args):
+    """Выполняет func(*args) в фоновом пуле, если задачи key еще нет.
+
+    Повторная отправка той же задачи, пока первая не выполнилась,
+    ничего не делает. При POSTS_BACKGROUND_WORKERS = 0 задача
+    выполняется сразу в текущем потоке.
+    """
+    with _pending_lock:
+        if key in _pending:
+            return False
+        _pending.add(key)
+    if not settings.POSTS_BACKGROUND_WORKERS:
+        _run(key, func, args)
+    else:
+        get_executor().submit(_run, key, func, args)
+    return True
@@ -0,0 +1,39 @@
+from django import template
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, fragment_name):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+
+    def render(self, context):
+        key = make_template_fragment_key(
+            self.fragment_name, [context.get('fragment_key')]
+        )
+        value = cache.get(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            if context.get('fragment_store'):
+                cache.set(key, value, context.get('fragment_timeout'))
+        return value
+
+
+@register.tag('fragment')
+def do_fragment(parser, token):
+    """{% fragment name %}...{% endfragment %} по fragment_context.
+
+    Как {% cache %} с ключом fragment_key, но без записи, когда
+    fragment_store ложно: фрагмент с реплики только читается из кэша.
+    """
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} ожидает один аргумент - имя фрагмента.'
+        )
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, bits[1])
@@ -0,0 +1,44 @@
+from django import template
+from django.conf import settings
+
+from posts import thumbnails
+
+register = template.Library()
+
+MIME_TYPES = {'AVIF': 'image/avif', 'WEBP': 'image/webp'}
+
+
+def srcset(variants):
+    return ', '.join(
+        f'{thumbnail.url} {width}w' for width, thumbnail in variants
+    )
+
+
+@register.inclusion_tag('includes/picture.html')
+def picture(image, css_class='card-img my-2'):
+    """Картинка поста в <picture> с вариантами разной ширины и формата.
+
+    Все варианты создаются заранее; в запросе читается только хранилище
+    ключей sorl. Пока готовых вариантов нет, показывается оригинал.
+    """
+    context = {'image': image, 'css_class': css_class}
+    if not image:
+        return context
+    formats, fallback = thumbnails.responsive(image)
+    context['sizes'] = settings.POSTS_THUMBNAIL_SIZES
+    context['sources'] = [
+        {'type': MIME_TYPES[image_format], 'srcset': srcset(variants)}
+        for image_format, variants in formats.items()
+        if image_format in MIME_TYPES
+    ]
+    if fallback:
+        _, largest = fallback[-1]
+        context.update(
+            src=largest.url,
+            srcset=srcset(fallback),
+            width=largest.width,
+            height=largest.height,
+        )
+    else:
+        context['src'] = image.url
+    return context
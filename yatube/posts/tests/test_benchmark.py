@@ -0,0 +1,64 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from posts import benchmark
+from posts.models import Comment, Follow, Post, TimelineEntry
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SIZES = {
+    'users': 5,
+    'groups': 2,
+    'posts': 30,
+    'comments': 20,
+    'follows': 6,
+    'images': 2,
+}
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_BACKGROUND_WORKERS=0)
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        benchmark.seed(SIZES)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_seed(self):
+        """Данные создаются в заданном объеме вместе с лентами."""
+        self.assertEqual(Post.objects.count(), SIZES['posts'])
+        self.assertEqual(Comment.objects.count(), SIZES['comments'])
+        self.assertEqual(Follow.objects.count(), SIZES['follows'])
+        self.assertEqual(
+            Post.objects.exclude(image='').count(), SIZES['images']
+        )
+        self.assertTrue(TimelineEntry.objects.exists())
+
+    def test_run(self):
+        """Для каждой страницы есть задержки, запросы и память."""
+        results = benchmark.run(repeat=3, cold=True)
+        self.assertIn('follow_index', results)
+        for name, metrics in results.items():
+            with self.subTest(name=name):
+                self.assertEqual(metrics['requests'], 3)
+                self.assertGreater(metrics['queries'], 0)
+                self.assertLessEqual(metrics['p50_ms'], metrics['max_ms'])
+                self.assertGreater(metrics['memory_kb'], 0)
+
+    def test_compare(self):
+        """Рост запросов и времени сверх допуска считается регрессией."""
+        baseline = {'index': {'queries': 3, 'p95_ms': 10, 'memory_kb': 100}}
+        self.assertEqual(benchmark.compare(
+            {'index': {'queries': 3, 'p95_ms': 11, 'memory_kb': 100}},
+            baseline, 0.2,
+        ), [])
+        self.assertEqual(len(benchmark.compare(
+            {'index': {'queries': 4, 'p95_ms': 13, 'memory_kb': 100}},
+            baseline, 0.2,
+        )), 2)
@@ -0,0 +1,137 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import counters
+from posts.models import Comment, FeedCounter, Follow, Group, Post
+
+User = get_user_model()
+
+
+def counter(feed):
+    return FeedCounter.objects.get(feed=feed).posts_count
+
+
+class FeedCounterTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.other_group = Group.objects.create(title='Другая', slug='other')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_signals_keep_counters(self):
+        """Создание, перенос и удаление поста двигают счетчики лент."""
+        self.assertEqual(counters.index_count(), 0)
+        self.assertEqual(counters.group_count(self.group), 0)
+        self.assertEqual(counters.group_count(self.other_group), 0)
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group
+        )
+        Post.objects.create(author=self.user, text='Без группы')
+        self.assertEqual(counter(counters.index_feed()), 2)
+        self.assertEqual(counter(counters.group_feed(self.group.pk)), 1)
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(counter(counters.group_feed(self.group.pk)), 0)
+        self.assertEqual(
+            counter(counters.group_feed(self.other_group.pk)), 1
+        )
+        post.delete()
+        self.assertEqual(counter(counters.index_feed()), 1)
+        self.assertEqual(
+            counter(counters.group_feed(self.other_group.pk)), 0
+        )
+
+    def test_missing_counter_is_not_guessed(self):
+        """Без строки сигналы счетчик не заводят: его честно посчитают."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}', group=self.group)
+            for i in range(5)
+        )
+        FeedCounter.objects.all().delete()
+        Post.objects.first().delete()
+        Post.objects.create(author=self.user, text='Новый', group=self.group)
+        self.assertFalse(FeedCounter.objects.exists())
+        self.assertEqual(counters.group_count(self.group), 5)
+        self.assertEqual(counters.index_count(), 5)
+        response = Client().get(
+            reverse('posts:group_list', args=(self.group.slug,))
+        )
+        self.assertEqual(len(response.context['page_obj']), 5)
+
+    def test_recount(self):
+        """Команда исправляет счетчики после вставки без сигналов."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}', group=self.group)
+            for i in range(3)
+        )
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.user, text='Коментарий')
+            for post in Post.objects.all()
+        )
+        call_command('recount_feeds', stdout=StringIO())
+        self.assertEqual(
+            set(Post.objects.values_list('comments_count', flat=True)), {1}
+        )
+        self.assertEqual(counter(counters.index_feed()), 3)
+        self.assertEqual(counter(counters.group_feed(self.group.pk)), 3)
+        self.assertEqual(self.user.stats.posts_count, 3)
+
+    def test_missing_counter_is_counted(self):
+        """Без строки счетчика размер считается и сохраняется."""
+        Post.objects.create(author=self.user, text='Пост')
+        FeedCounter.objects.all().delete()
+        self.assertEqual(counters.index_count(), 1)
+        self.assertEqual(counter(counters.index_feed()), 1)
+
+    def test_follow_count(self):
+        """Размер ленты подписок ведет счетчик читателя."""
+        reader = User.objects.create_user(username='reader')
+        Post.objects.create(author=self.user, text='Старый пост')
+        self.assertEqual(counters.follow_count(reader), 0)
+        Follow.objects.create(user=reader, author=self.user)
+        for i in range(3):
+            Post.objects.create(author=self.user, text=f'Пост {i}')
+        Post.objects.filter(text='Пост 0').delete()
+        with self.assertNumQueries(2):
+            self.assertEqual(counters.follow_count(reader), 3)
+        self.assertEqual(counter(counters.timeline_feed(reader.pk)), 3)
+        Follow.objects.filter(user=reader).delete()
+        self.assertEqual(counters.follow_count(reader), 0)
+
+    def test_feeds_do_not_count_posts(self):
+        """Ленты не делают COUNT по таблице постов."""
+        counters.group_count(self.group)
+        Post.objects.create(author=self.user, text='Пост', group=self.group)
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        client = Client()
+        client.force_login(reader)
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:follow_index'),
+        ):
+            with self.subTest(url=url):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                self.assertEqual(
+                    response.context['page_obj'].paginator.count, 1
+                )
+                for query in queries.captured_queries:
+                    self.assertNotIn(
+                        'COUNT(*) AS "__count" FROM "posts_post"',
+                        query['sql'],
+                    )
@@ -0,0 +1,103 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.urls import reverse
+
+from posts.follows import FollowGraph
+from posts.models import Follow
+from posts.tests.utils import migrate, migrate_to_latest
+
+User = get_user_model()
+
+
+class FollowGraphTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Читатель')
+        cls.authors = [
+            User.objects.create_user(username=f'Автор{number}')
+            for number in range(5)
+        ]
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def expected(self):
+        return {
+            author.pk: number < 2 for number, author in enumerate(self.authors)
+        }
+
+    def test_one_query_for_many_authors(self):
+        """Подписки на всех авторов - один запрос, потом кэш и memo."""
+        ids = [author.pk for author in self.authors]
+        graph = FollowGraph(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(graph.following(ids), self.expected())
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(ids[0]))
+            self.assertEqual(
+                FollowGraph(self.user).following(ids), self.expected()
+            )
+
+    @override_settings(FOLLOW_CACHE_MAX_AUTHORS=1)
+    def test_many_follows_not_cached(self):
+        """Большое множество подписок не кэшируется: запрос по авторам."""
+        ids = [author.pk for author in self.authors]
+        FollowGraph(self.user).following(ids)
+        graph = FollowGraph(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(graph.following(ids), self.expected())
+        with self.assertNumQueries(0):
+            graph.following(ids[:3])
+
+    def test_anonymous(self):
+        """Гость ни на кого не подписан, запросов нет."""
+        with self.assertNumQueries(0):
+            self.assertFalse(
+                FollowGraph(AnonymousUser()).is_following(self.authors[0].pk)
+            )
+
+    def test_follow_and_unfollow_invalidate(self):
+        """Подписка и отписка сразу видны на странице автора."""
+        author = self.authors[3]
+        url = reverse('posts:profile', kwargs={'username': author.username})
+        self.assertFalse(self.authorized_client.get(url).context['following'])
+        self.authorized_client.get(
+            reverse('posts:profile_follow', kwargs={'username': author})
+        )
+        self.assertTrue(self.authorized_client.get(url).context['following'])
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': author})
+        )
+        self.assertFalse(self.authorized_client.get(url).context['following'])
+
+
+class DuplicateFollowMigrationTest(TransactionTestCase):
+    def tearDown(self):
+        migrate_to_latest()
+        super().tearDown()
+
+    def test_duplicates_removed_before_constraint(self):
+        """Миграция оставляет первую из повторных подписок."""
+        apps = migrate('0009_authorstats')
+        HistoricalUser = apps.get_model('auth', 'User')
+        HistoricalFollow = apps.get_model('posts', 'Follow')
+        reader = HistoricalUser.objects.create(username='Читатель')
+        author = HistoricalUser.objects.create(username='Автор')
+        other = HistoricalUser.objects.create(username='Другой')
+        first = HistoricalFollow.objects.create(user=reader, author=author)
+        HistoricalFollow.objects.create(user=reader, author=author)
+        single = HistoricalFollow.objects.create(user=reader, author=other)
+        migrate('0010_feed_indexes')
+        self.assertEqual(
+            set(Follow.objects.values_list('pk', flat=True)),
+            {first.pk, single.pk},
+        )
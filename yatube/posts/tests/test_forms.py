@@ -15,9 +15,13 @@ TEST_CACHE_SETTING = {
     'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
 }
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_STAGING_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POSTS_STAGING_ROOT=TEMP_STAGING_ROOT,
+)
 class PostFormTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -38,6 +42,7 @@ class PostFormTest(TestCase):
     def tearDownClass(cls):
         super().tearDownClass()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_STAGING_ROOT, ignore_errors=True)
 
     def test_create_task(self):
         """Валидная форма создает запись в Task."""
@@ -125,12 +130,8 @@ class PostFormTest(TestCase):
             data=form_data,
             follow=True
         )
-        self.assertTrue(
-            Post.objects.filter(
-                text='Тестовый текст',
-                image='posts/small.gif'
-            ).exists()
-        )
+        post = Post.objects.get(text='Тестовый текст')
+        self.assertRegex(post.image.name, r'^posts/\w{2}/\w{64}\.gif$')
         self.assertRedirects(
             response, reverse('posts:profile', args=[self.user.username])
         )
@@ -0,0 +1,110 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from posts import graph
+from posts.models import AuthorStats, Follow, FollowSuggestion
+
+User = get_user_model()
+
+
+class FollowGraphQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader, cls.friend, cls.other, cls.star, cls.quiet = (
+            User.objects.create_user(username=name)
+            for name in ('reader', 'friend', 'other', 'star', 'quiet')
+        )
+        edges = (
+            (cls.reader, cls.friend),
+            (cls.reader, cls.other),
+            (cls.friend, cls.reader),
+            (cls.friend, cls.star),
+            (cls.other, cls.star),
+            (cls.other, cls.quiet),
+            (cls.quiet, cls.star),
+        )
+        for user, author in edges:
+            Follow.objects.create(user=user, author=author)
+
+    def test_counters_follow_signals(self):
+        """Подписка и отписка двигают оба счетчика."""
+        stats = AuthorStats.objects.get(user=self.reader)
+        self.assertEqual(
+            (stats.followers_count, stats.following_count), (1, 2)
+        )
+        Follow.objects.get(user=self.reader, author=self.other).delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.following_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.other).followers_count, 0
+        )
+
+    def test_profile_shows_counters(self):
+        """Счетчики видны на странице автора и меняются после подписки."""
+        url = reverse('posts:profile', kwargs={'username': 'star'})
+        client = Client()
+        self.assertContains(client.get(url), 'Подписчиков: 3, подписок: 0')
+        follower = Client()
+        follower.force_login(self.reader)
+        follower.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'star'}
+        ))
+        self.assertContains(client.get(url), 'Подписчиков: 4, подписок: 0')
+
+    def test_mutual(self):
+        """Взаимные подписки."""
+        self.assertTrue(graph.is_mutual(self.reader.pk, self.friend.pk))
+        self.assertFalse(graph.is_mutual(self.reader.pk, self.other.pk))
+        self.assertEqual(
+            list(graph.mutual_follows(self.reader)), [self.friend]
+        )
+
+    def test_top_followed(self):
+        """Популярные авторы по счетчику подписчиков."""
+        with self.assertNumQueries(1):
+            top = graph.top_followed(2)
+        self.assertEqual(top[0], self.star)
+        self.assertEqual(len(top), 2)
+
+    def test_suggestions_refreshed_by_command(self):
+        """Рекомендации - подписки подписок, без себя и уже читаемых."""
+        out = StringIO()
+        call_command('refresh_follow_graph', batch_size=2, stdout=out)
+        self.assertIn('4 читателей, 3 рекомендаций', out.getvalue())
+        with self.assertNumQueries(1):
+            suggested = graph.suggestions(self.reader)
+        self.assertEqual(suggested, [self.star, self.quiet])
+        self.assertEqual(
+            FollowSuggestion.objects.get(
+                user=self.reader, author=self.star
+            ).score,
+            2,
+        )
+        self.assertEqual(graph.suggestions(self.friend), [self.other])
+        Follow.objects.filter(user=self.quiet).delete()
+        FollowSuggestion.objects.create(
+            user=self.quiet, author=self.reader, score=1
+        )
+        call_command('refresh_follow_graph', stdout=StringIO())
+        self.assertEqual(graph.suggestions(self.quiet), [])
+
+
+class FollowerDeletionTest(TransactionTestCase):
+    def test_delete_follower(self):
+        """Подписчика можно удалить, счетчик автора уменьшается."""
+        follower = User.objects.create_user(username='follower')
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=follower, author=author)
+        follower_id = follower.pk
+        follower.delete()
+        self.assertFalse(
+            AuthorStats.objects.filter(user_id=follower_id).exists()
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(user=author).followers_count, 0
+        )
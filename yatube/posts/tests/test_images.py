@@ -0,0 +1,286 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from core.storage import ContentAddressedStorage
+from posts import images
+from posts.models import Post, StoredFile
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_STAGING_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+ORIENTATION = 0x0112
+CONTENT_NAME = r'^posts/\w{2}/\w{64}\.jpg$'
+
+
+def photo(name='photo.jpg', size=(3000, 1000), orientation=6):
+    exif = Image.Exif()
+    exif[ORIENTATION] = orientation
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+def stage_photo(post):
+    return images.staging_storage().save(
+        f'{post.pk}/photo.jpg', ContentFile(photo().read())
+    )
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POSTS_STAGING_ROOT=TEMP_STAGING_ROOT,
+    POSTS_BACKGROUND_WORKERS=0,
+    POSTS_IMAGE_MAX_SIZE=(800, 800),
+)
+class ImageProcessingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_STAGING_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        shutil.rmtree(TEMP_STAGING_ROOT, ignore_errors=True)
+
+    def test_upload_is_processed(self):
+        """Картинка повернута по EXIF, уменьшена и без EXIF."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Фото', 'image': photo()},
+        )
+        post = Post.objects.get(text='Фото')
+        self.assertEqual(post.image_status, Post.IMAGE_READY)
+        self.assertRegex(post.image.name, CONTENT_NAME)
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (267, 800))
+            self.assertNotIn(ORIENTATION, image.getexif())
+        self.assertEqual(list(images.staged_images()), [])
+        self.assertEqual(os.listdir(TEMP_STAGING_ROOT), [])
+
+    def test_processing_state(self):
+        """Пока картинка в очереди, у поста статус processing.
+
+        Незавершенные загрузки дообрабатывает команда.
+        """
+        with mock.patch('posts.tasks.submit') as submit:
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': 'В очереди', 'image': photo('queued.jpg')},
+            )
+        post = Post.objects.get(text='В очереди')
+        self.assertEqual(post.image_status, Post.IMAGE_PROCESSING)
+        self.assertFalse(post.image)
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, 'Картинка обрабатывается')
+        self.assertTrue(submit.called)
+        call_command('process_staged_images', stdout=StringIO())
+        self.assertEqual(list(images.staged_images()), [])
+        post.refresh_from_db()
+        self.assertEqual(post.image_status, Post.IMAGE_READY)
+        self.assertRegex(post.image.name, CONTENT_NAME)
+
+    def test_edit_keeps_old_image_until_processed(self):
+        """При замене картинки старая видна до конца обработки."""
+        post = Post.objects.create(
+            author=self.user, text='Пост',
+            image=ContentFile(b'old', name='old.jpg'),
+        )
+        old_name = post.image.name
+        with mock.patch('posts.tasks.submit'):
+            self.authorized_client.post(
+                reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+                data={'text': 'Пост', 'image': photo('new.jpg')},
+            )
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, old_name)
+        self.assertEqual(post.image_status, Post.IMAGE_PROCESSING)
+
+    def test_upload_is_staged_outside_media(self):
+        """До обработки исходник лежит вне MEDIA_ROOT."""
+        with mock.patch('posts.tasks.submit') as submit:
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': 'Фото', 'image': photo('secret.jpg')},
+            )
+        staged = submit.call_args[0][3]
+        path = images.staging_storage().path(staged)
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(path.startswith(TEMP_STAGING_ROOT))
+        self.assertFalse(default_storage.exists(staged))
+
+    def test_edit_keeps_finished_processing(self):
+        """Правка не затирает картинку, которую поставила обработка."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        form_post = Post.objects.get(pk=post.pk)
+        Post.objects.filter(pk=post.pk).update(image='posts/ready.jpg')
+        with mock.patch('posts.views.get_object_or_404',
+                        return_value=form_post):
+            self.authorized_client.post(
+                reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+                data={'text': 'Новый текст'},
+            )
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertEqual(post.image.name, 'posts/ready.jpg')
+
+    def test_failed_save_keeps_upload(self):
+        """Если результат не записался, исходник остается в staging."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image_status=Post.IMAGE_PROCESSING
+        )
+        staging = images.staging_storage()
+        staged = stage_photo(post)
+        locked = OperationalError('database is locked')
+        with mock.patch.object(Post, 'save', side_effect=locked):
+            with self.assertRaises(OperationalError):
+                images.process(post.pk, staged)
+        self.assertTrue(staging.exists(staged))
+        post.refresh_from_db()
+        self.assertEqual(post.image_status, Post.IMAGE_PROCESSING)
+        call_command('process_staged_images', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.image_status, Post.IMAGE_READY)
+        self.assertEqual(os.listdir(TEMP_STAGING_ROOT), [])
+
+    def test_broken_image_fails(self):
+        """Битая картинка дает статус failed, staging очищается."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        staging = images.staging_storage()
+        staged = staging.save(
+            f'{post.pk}/broken.jpg', ContentFile(b'not an image')
+        )
+        with self.assertLogs('posts.images', 'ERROR'):
+            images.process(post.pk, staged)
+        post.refresh_from_db()
+        self.assertEqual(post.image_status, Post.IMAGE_FAILED)
+        self.assertFalse(staging.exists(staged))
+        self.assertFalse(os.path.exists(
+            os.path.join(TEMP_MEDIA_ROOT, 'posts', 'broken.jpg')
+        ))
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POSTS_STAGING_ROOT=TEMP_STAGING_ROOT,
+    POSTS_BACKGROUND_WORKERS=0,
+)
+class StoredFileTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_STAGING_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Байты в тестах не картинки: миниатюры для них не нужны.
+        submit = mock.patch('posts.tasks.submit')
+        submit.start()
+        self.addCleanup(submit.stop)
+
+    def create_post(self, content, name='photo.jpg'):
+        return Post.objects.create(
+            author=self.user, text='Пост',
+            image=ContentFile(content, name=name),
+        )
+
+    def collect(self, *args):
+        out = StringIO()
+        call_command(
+            'collect_media_garbage', '--grace-hours=0', *args, stdout=out
+        )
+        return out.getvalue()
+
+    def test_concurrent_same_upload(self):
+        """Параллельная загрузка того же файла получает то же имя."""
+        name = default_storage.save('posts/a.jpg', ContentFile(b'race'))
+        with mock.patch.object(ContentAddressedStorage, 'exists',
+                               return_value=False):
+            again = default_storage.save('posts/b.jpg', ContentFile(b'race'))
+        self.assertEqual(again, name)
+
+    def test_same_content_stored_once(self):
+        """Одинаковые файлы хранятся один раз, ссылки считаются."""
+        first = self.create_post(b'same', 'first.jpg')
+        second = self.create_post(b'same', 'second.jpg')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, CONTENT_NAME)
+        self.assertEqual(
+            StoredFile.objects.get(name=first.image.name).refcount, 2
+        )
+        other = self.create_post(b'other')
+        self.assertNotEqual(other.image.name, first.image.name)
+
+    def test_garbage_collected(self):
+        """Файл удаляется, только когда на него не ссылается ни один пост."""
+        first = self.create_post(b'shared')
+        second = self.create_post(b'shared')
+        name = first.image.name
+        first.delete()
+        self.assertIn('Удалено файлов: 0', self.collect())
+        self.assertTrue(default_storage.exists(name))
+        Post.objects.get(pk=second.pk).delete()
+        self.assertEqual(StoredFile.objects.get(name=name).refcount, 0)
+        self.assertIn('К удалению файлов: 1', self.collect('--dry-run'))
+        self.assertTrue(default_storage.exists(name))
+        self.assertIn(name, self.collect())
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+
+    def test_replaced_image_released(self):
+        """Замененная картинка теряет ссылку."""
+        post = self.create_post(b'before')
+        old_name = post.image.name
+        post.image = ContentFile(b'after', name='photo.jpg')
+        post.save()
+        self.assertEqual(StoredFile.objects.get(name=old_name).refcount, 0)
+        self.assertEqual(
+            StoredFile.objects.get(name=post.image.name).refcount, 1
+        )
+
+    def test_scan_finds_untracked(self):
+        """--scan находит файлы, о которых нет записи."""
+        name = default_storage.save('posts/legacy.jpg', ContentFile(b'x'))
+        StoredFile.objects.filter(name=name).delete()
+        self.collect()
+        self.assertTrue(default_storage.exists(name))
+        self.collect('--scan')
+        self.assertFalse(default_storage.exists(name))
+
+    def test_grace_period(self):
+        """Свежие файлы без ссылок не удаляются."""
+        post = self.create_post(b'fresh')
+        name = post.image.name
+        post.delete()
+        out = StringIO()
+        call_command('collect_media_garbage', stdout=out)
+        self.assertIn('Удалено файлов: 0', out.getvalue())
+        self.assertTrue(default_storage.exists(name))
@@ -0,0 +1,82 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, override_settings
+
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.utils import full_scans, query_plan, temp_sorts
+from posts.timeline import follow_feed
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class FeedIndexesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Имя')
+        authors = [
+            User.objects.create_user(username=f'Автор{i}') for i in range(5)
+        ]
+        groups = [
+            Group.objects.create(title=f'Группа {i}', slug=f'group_{i}',
+                                 description='Тестовое описание')
+            for i in range(3)
+        ]
+        Post.objects.bulk_create(
+            Post(author=authors[i % 5], group=groups[i % 3],
+                 text=f'Тестовый пост {i}')
+            for i in range(200)
+        )
+        for author in authors[:3]:
+            Follow.objects.create(user=cls.user, author=author)
+        cls.post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text='Коментарий')
+            for _ in range(20)
+        )
+        cls.group = groups[0]
+        cls.author = authors[0]
+
+    def assert_indexed(self, queryset, allow_sort=False):
+        plan = query_plan(queryset)
+        self.assertEqual(full_scans(plan), [], plan)
+        if not allow_sort:
+            self.assertEqual(temp_sorts(plan), [], plan)
+
+    def test_feed_queries_use_indexes(self):
+        """Ленты читаются по индексу без сортировки всей таблицы."""
+        feeds = {
+            'index': Post.objects.feed(),
+            'group': self.group.posts.feed(),
+            'profile': self.author.posts.feed(),
+        }
+        for name, feed in feeds.items():
+            with self.subTest(feed=name):
+                self.assert_indexed(feed[:10])
+                last = feed.order_by('-pub_date', '-id')[9]
+                self.assert_indexed(feed.filter(
+                    Q(pub_date__lte=last.pub_date)
+                    & (Q(pub_date__lt=last.pub_date)
+                       | Q(pub_date=last.pub_date, id__lt=last.id))
+                ).order_by('-pub_date', '-id')[:11])
+
+    def test_follow_feed_is_indexed_range_read(self):
+        """Лента подписок читается диапазоном индекса ленты."""
+        self.assert_indexed(follow_feed(self.user)[:10])
+
+    @override_settings(TIMELINE_PULL_FOLLOWERS=1)
+    def test_hybrid_follow_feed_has_no_full_scan(self):
+        """Смешанная лента подписок не читает таблицы целиком."""
+        self.assert_indexed(follow_feed(self.user)[:10], allow_sort=True)
+
+    def test_comments_and_follow_lookups_use_indexes(self):
+        """Комментарии поста и подписки ищутся по индексам."""
+        self.assert_indexed(self.post.comments.order_by('created', 'id'))
+        self.assert_indexed(Follow.objects.filter(author=self.author))
+        self.assert_indexed(
+            Follow.objects.filter(user=self.user, author=self.author)
+        )
@@ -1,7 +1,10 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
 
-from posts.models import Group, Post
+from posts.models import AuthorStats, Group, Post
 
 User = get_user_model()
 
@@ -102,3 +105,54 @@ class GroupModelTest(TestCase):
                 self.assertEqual(
                     group._meta.get_field(field).help_text, expected_value
                 )
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.other_user = User.objects.create_user(username='other')
+
+    def posts_count(self, user):
+        return AuthorStats.for_user(User.objects.get(pk=user.pk)).posts_count
+
+    def test_counter_follows_create_and_delete(self):
+        """Счетчик постов растет при создании и падает при удалении."""
+        posts = [
+            Post.objects.create(author=self.user, text='Тестовый пост')
+            for _ in range(3)
+        ]
+        self.assertEqual(self.posts_count(self.user), 3)
+        posts[0].delete()
+        Post.objects.filter(pk=posts[1].pk).delete()
+        self.assertEqual(self.posts_count(self.user), 1)
+        self.assertEqual(self.posts_count(self.other_user), 0)
+
+    def test_counter_follows_author_change(self):
+        """Смена автора переносит пост между счетчиками."""
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        post.author = self.other_user
+        post.save()
+        self.assertEqual(self.posts_count(self.user), 0)
+        self.assertEqual(self.posts_count(self.other_user), 1)
+
+    def test_rebuild_command_fixes_drift(self):
+        """Команда rebuild_author_stats пересчитывает счетчики с нуля."""
+        Post.objects.create(author=self.user, text='Тестовый пост')
+        Post.objects.create(author=self.user, text='Тестовый пост')
+        Post.objects.update(author=self.other_user)
+        call_command('rebuild_author_stats', stdout=StringIO())
+        self.assertEqual(self.posts_count(self.user), 0)
+        self.assertEqual(self.posts_count(self.other_user), 2)
+
+
+class AuthorDeletionTest(TransactionTestCase):
+    def test_delete_author_with_posts(self):
+        """Автора с постами можно удалить, счетчики не мешают каскаду."""
+        user = User.objects.create_user(username='auth')
+        Post.objects.create(author=user, text='Тестовый пост')
+        Post.objects.create(author=user, text='Тестовый пост')
+        user.delete()
+        self.assertFalse(User.objects.filter(username='auth').exists())
+        self.assertFalse(AuthorStats.objects.exists())
@@ -0,0 +1,115 @@
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import popular
+from posts.models import Comment, Follow, Group, PopularPost, Post
+
+User = get_user_model()
+
+
+class PopularTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+
+    def create_post(self, text, **kwargs):
+        return Post.objects.create(author=self.author, text=text, **kwargs)
+
+    def comment(self, post, count=1):
+        for _ in range(count):
+            Comment.objects.create(post=post, author=self.reader, text='!')
+
+    def page(self, **params):
+        response = Client().get(reverse('posts:popular'), params)
+        return [post.text for post in response.context['page_obj']]
+
+    def test_decay_in_log_space(self):
+        """Вес события затухает вдвое за период полураспада."""
+        now = timezone.now()
+        score = popular.event_score(1.0, now)
+        later = now + timedelta(hours=24)
+        self.assertAlmostEqual(popular.decayed(score, now), 1.0)
+        self.assertAlmostEqual(popular.decayed(score, later), 0.5)
+        both = popular.logaddexp(score, popular.event_score(1.0, now))
+        self.assertAlmostEqual(popular.decayed(both, now), 2.0)
+
+    def test_comments_raise_post(self):
+        """Комментарии поднимают пост выше более нового."""
+        old = self.create_post('Обсуждаемый')
+        self.create_post('Новый')
+        self.assertEqual(self.page(), ['Новый', 'Обсуждаемый'])
+        self.comment(old, 2)
+        self.assertEqual(self.page(), ['Обсуждаемый', 'Новый'])
+
+    def test_follow_raises_recent_posts(self):
+        """Новый подписчик поднимает последние посты автора."""
+        post = self.create_post('Пост')
+        before = Post.objects.get(pk=post.pk).popularity
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertGreater(Post.objects.get(pk=post.pk).popularity, before)
+
+    def test_group_feed(self):
+        """У группы своя лента; при смене группы пост ее покидает."""
+        post = self.create_post('В группе', group=self.group)
+        self.create_post('Без группы')
+        self.assertEqual(self.page(group='group'), ['В группе'])
+        post.group = None
+        post.save()
+        self.assertEqual(self.page(group='group'), [])
+        self.assertEqual(len(self.page()), 2)
+
+    @override_settings(POPULAR_TOP=2)
+    def test_only_top_stored(self):
+        """В ленте хранятся только лучшие POPULAR_TOP постов."""
+        posts = [self.create_post(f'Пост {number}') for number in range(3)]
+        self.comment(posts[0], 3)
+        self.assertEqual(self.page(), ['Пост 0', 'Пост 2'])
+        self.assertEqual(PopularPost.objects.count(), 2)
+
+    def test_rebuild_matches_incremental(self):
+        """Пересчет с нуля дает те же оценки, что и события."""
+        first = self.create_post('Первый', group=self.group)
+        second = self.create_post('Второй')
+        self.comment(first, 2)
+        self.comment(second)
+        scores = dict(Post.objects.values_list('pk', 'popularity'))
+        PopularPost.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_popular', stdout=out)
+        self.assertIn('2 постов', out.getvalue())
+        for pk, popularity in Post.objects.values_list('pk', 'popularity'):
+            self.assertAlmostEqual(popularity, scores[pk], places=4)
+        self.assertEqual(self.page(), ['Первый', 'Второй'])
+        self.assertEqual(self.page(group='group'), ['Первый'])
+
+    def test_migration_backfill_matches_rebuild(self):
+        """Миграция заполняет популярное так же, как пересчет."""
+        first = self.create_post('Первый', group=self.group)
+        self.create_post('Второй')
+        self.comment(first, 2)
+        call_command('rebuild_popular', stdout=StringIO())
+        expected = set(PopularPost.objects.values_list('feed', 'post_id'))
+        scores = dict(Post.objects.values_list('pk', 'popularity'))
+        PopularPost.objects.all().delete()
+        Post.objects.update(popularity=0)
+        import_module('posts.migrations.0018_popular').fill_popular(
+            apps, None
+        )
+        self.assertEqual(
+            set(PopularPost.objects.values_list('feed', 'post_id')), expected
+        )
+        for pk, popularity in Post.objects.values_list('pk', 'popularity'):
+            self.assertAlmostEqual(popularity, scores[pk], places=4)
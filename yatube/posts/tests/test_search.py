@@ -0,0 +1,108 @@
+from io import StringIO
+
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+
+class StemTest(TestCase):
+    def test_word_forms_share_stem(self):
+        """Формы одного слова дают одну основу."""
+        for forms in (
+            ('книга', 'книги', 'книгой', 'книгами'),
+            ('красивый', 'красивая', 'красивого', 'красивые'),
+            ('ёлка', 'елки', 'Ёлкой'),
+        ):
+            with self.subTest(forms=forms):
+                self.assertEqual(len({search.stem(w) for w in forms}), 1)
+
+    def test_terms(self):
+        """Латиница и числа в индекс попадают без изменений."""
+        self.assertEqual(
+            search.terms('Пишу на Django 2'), ['пиш', 'на', 'django', '2']
+        )
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.books = Post.objects.create(
+            author=cls.user, text='Читаю новые книги о кошках'
+        )
+        cls.cats = Post.objects.create(
+            author=cls.user, text='Кошка спит на книге'
+        )
+        cls.other = Post.objects.create(
+            author=cls.user, text='Совсем другой текст'
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_search_by_word_forms(self):
+        """Поиск находит посты по другим формам слов, новые первыми."""
+        self.assertEqual(self.found('книга'), [self.cats, self.books])
+        self.assertEqual(self.found('кошки книгу'), [self.cats, self.books])
+        self.assertEqual(self.found('спящая кошка'), [])
+        self.assertEqual(self.found('другого'), [self.other])
+
+    def test_empty_query(self):
+        """Пустой запрос и запрос из знаков ничего не находят."""
+        self.assertEqual(self.found(''), [])
+        self.assertEqual(self.found('"*?'), [])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        other = Post.objects.get(pk=self.other.pk)
+        other.text = 'Теперь про кошку'
+        other.save()
+        self.assertIn(other, self.found('кошка'))
+        self.assertEqual(self.found('другой'), [])
+        Post.objects.get(pk=self.cats.pk).delete()
+        self.assertEqual(self.found('спит'), [])
+
+    def test_pagination_keeps_query(self):
+        """Ссылки пагинатора сохраняют поисковый запрос."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Книга номер {number}')
+            for number in range(12)
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.client.get(reverse('posts:search'), {'q': 'книги'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 14)
+        self.assertContains(
+            response, '?q=%D0%BA%D0%BD%D0%B8%D0%B3%D0%B8&amp;page=2'
+        )
+
+    def test_admin_uses_index(self):
+        """Поиск в админке идет через полнотекстовый индекс."""
+        admin = site._registry[Post]
+        request = RequestFactory().get('/')
+        queryset, use_distinct = admin.get_search_results(
+            request, Post.objects.all(), 'книгам'
+        )
+        self.assertFalse(use_distinct)
+        self.assertEqual(set(queryset), {self.books, self.cats})
+        self.assertIn(search.TABLE, str(queryset.query))
+
+    def test_search_uses_fts(self):
+        """Страница результатов не сканирует таблицу постов."""
+        with self.assertNumQueries(3) as queries:
+            self.found('книга')
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('LIKE', sql)
+        self.assertEqual(connection.vendor, 'sqlite')
@@ -0,0 +1,29 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from posts import tasks
+
+
+class TasksTest(SimpleTestCase):
+    def run_in_thread(self, key):
+        thread = threading.Thread(target=tasks.submit, args=(key, len, ''))
+        thread.start()
+        thread.join()
+
+    @override_settings(POSTS_BACKGROUND_WORKERS=0)
+    def test_inline_task_keeps_connections(self):
+        """Задача в потоке запроса не закрывает его соединения."""
+        with mock.patch('posts.tasks.connections') as connections:
+            self.run_in_thread('inline')
+        connections.close_all.assert_not_called()
+
+    @override_settings(POSTS_BACKGROUND_WORKERS=1)
+    def test_pool_task_closes_connections(self):
+        """Поток пула закрывает свои соединения после задачи."""
+        with mock.patch('posts.tasks.connections') as connections:
+            with mock.patch('posts.tasks._executor', None):
+                tasks.submit('pool', len, '')
+                tasks.get_executor().shutdown()
+        connections.close_all.assert_called_once()
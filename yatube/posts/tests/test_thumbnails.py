@@ -0,0 +1,177 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import default, get_thumbnail
+
+from posts.models import Group, Post
+from posts import thumbnails
+from posts.thumbnails import PregeneratedThumbnailBackend
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_STAGING_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+GEOMETRY = '960x339'
+OPTIONS = {'crop': 'center', 'upscale': True}
+
+
+def small_gif(color=b'\xFF'):
+    """Картинка 2x1; одинаковые байты дают один файл в хранилище."""
+    return (
+        b'\x47\x49\x46\x38\x39\x61\x02\x00'
+        b'\x01\x00\x80\x00\x00\x00\x00\x00'
+        + color * 3 + b'\x21\xF9\x04\x00\x00'
+        b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+        b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+        b'\x0A\x00\x3B'
+    )
+
+
+def thumbnail_for(name):
+    _, thumbnail = PregeneratedThumbnailBackend().prepare(
+        name, GEOMETRY, dict(OPTIONS)
+    )
+    return default.kvstore.get(thumbnail)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POSTS_STAGING_ROOT=TEMP_STAGING_ROOT,
+    POSTS_BACKGROUND_WORKERS=0,
+)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_STAGING_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def test_thumbnail_created_on_upload(self):
+        """Миниатюра создается сразу после загрузки картинки."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с картинкой',
+                'image': SimpleUploadedFile(
+                    'upload.gif', small_gif(b'\x10'), content_type='image/gif'
+                ),
+            },
+        )
+        post = Post.objects.get(text='Пост с картинкой')
+        thumbnail = thumbnail_for(post.image.name)
+        self.assertIsNotNone(thumbnail)
+        self.assertTrue(thumbnail.exists())
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+
+    def test_template_does_not_resize(self):
+        """Без готовой миниатюры шаблон показывает исходную картинку."""
+        with mock.patch('posts.tasks.submit') as submit:
+            post = Post.objects.create(
+                author=self.user,
+                text='Пост',
+                image=ContentFile(small_gif(b'\x20'), name='missing.gif'),
+            )
+            thumbnail = get_thumbnail(post.image, GEOMETRY, **OPTIONS)
+        self.assertEqual(thumbnail.url, post.image.url)
+        self.assertTrue(submit.called)
+        self.assertIsNone(thumbnail_for(post.image.name))
+
+    def test_backfill_command(self):
+        """Команда создает миниатюры для уже загруженных картинок."""
+        with mock.patch('posts.tasks.submit'):
+            post = Post.objects.create(
+                author=self.user,
+                text='Старый пост',
+                image=ContentFile(small_gif(b'\x30'), name='old.gif'),
+            )
+        out = StringIO()
+        call_command('generate_thumbnails', workers=1, stdout=out)
+        self.assertIsNotNone(thumbnail_for(post.image.name))
+        created = len(list(thumbnails.presets()))
+        self.assertIn(f'Создано миниатюр: {created}', out.getvalue())
+
+    def test_picture_srcset(self):
+        """Лента отдает варианты разной ширины с ленивой загрузкой."""
+        post = Post.objects.create(
+            author=self.user,
+            text='Пост',
+            image=ContentFile(small_gif(b'\x40'), name='srcset.gif'),
+        )
+        response = Client().get(reverse('posts:index'))
+        for width in settings.POSTS_THUMBNAIL_WIDTHS:
+            self.assertContains(response, f' {width}w')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(
+            response, f'sizes="{settings.POSTS_THUMBNAIL_SIZES}"'
+        )
+        self.assertNotContains(response, post.image.url)
+
+    def test_picture_without_variants(self):
+        """Пока вариантов нет, в <picture> только оригинал."""
+        with mock.patch('posts.tasks.submit'):
+            post = Post.objects.create(
+                author=self.user,
+                text='Пост',
+                image=ContentFile(small_gif(b'\x50'), name='fresh.gif'),
+            )
+            response = Client().get(reverse('posts:index'))
+        self.assertContains(response, f'src="{post.image.url}"')
+        self.assertNotContains(response, 'srcset=')
+
+    def test_ready_thumbnails_reach_cached_pages(self):
+        """Готовые миниатюры сменяют оригинал в закэшированных страницах."""
+        group = Group.objects.create(title='Группа', slug='group')
+        with mock.patch('posts.tasks.submit'):
+            post = Post.objects.create(
+                author=self.user,
+                text='Пост',
+                group=group,
+                image=ContentFile(small_gif(b'\x60'), name='cached.gif'),
+            )
+            urls = (
+                reverse('posts:index'),
+                reverse('posts:group_list', kwargs={'slug': group.slug}),
+                reverse('posts:profile', kwargs={'username': 'auth'}),
+                reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+            )
+            for url in urls:
+                for client in (Client(), self.authorized_client):
+                    self.assertContains(
+                        client.get(url), f'src="{post.image.url}"'
+                    )
+        for geometry_string, options in thumbnails.presets():
+            thumbnails.generate(post.image.name, geometry_string, options)
+        for url in urls:
+            for client in (Client(), self.authorized_client):
+                with self.subTest(url=url, client=client):
+                    self.assertNotContains(
+                        client.get(url), f'src="{post.image.url}"'
+                    )
+
+    @override_settings(POSTS_THUMBNAIL_FORMATS=('AVIF', 'PNG'))
+    def test_unsupported_formats_skipped(self):
+        """Форматы, которые не умеют Pillow или sorl, пропускаются."""
+        self.assertEqual(thumbnails.modern_formats(), ['PNG'])
+        widths = len(settings.POSTS_THUMBNAIL_WIDTHS)
+        self.assertEqual(len(thumbnails.variants()), widths * 2)
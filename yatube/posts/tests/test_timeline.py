@@ -0,0 +1,135 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.urls import reverse
+
+from posts import counters
+from posts.models import AuthorStats, Follow, Post, TimelineEntry
+from posts.tests.utils import migrate, migrate_to_latest
+from posts.timeline import follow_feed
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Читатель')
+        cls.author = User.objects.create_user(username='Автор')
+        cls.other_author = User.objects.create_user(username='Автор2')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def follow_page(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_new_post_is_pushed_to_followers(self):
+        """Новый пост попадает в ленты подписчиков автора."""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        Post.objects.create(author=self.other_author, text='Чужой пост')
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+        self.assertEqual(self.follow_page(), [post])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка дописывает старые посты, отписка их убирает."""
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(3)
+        ]
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args=(self.author.username,))
+        )
+        self.assertEqual(self.follow_page(), posts[::-1])
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', args=(self.author.username,))
+        )
+        self.assertEqual(self.follow_page(), [])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    @override_settings(TIMELINE_PULL_FOLLOWERS=1)
+    def test_popular_author_posts_are_pulled_on_read(self):
+        """Посты популярных авторов не раскладываются, а читаются."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.user, author=self.other_author)
+        pulled = Post.objects.create(author=self.author, text='Популярный')
+        self.assertFalse(TimelineEntry.objects.exists())
+        with self.settings(TIMELINE_PULL_FOLLOWERS=2):
+            pushed = Post.objects.create(author=self.other_author,
+                                         text='Обычный')
+        self.assertEqual(self.follow_page(), [pushed, pulled])
+
+
+@override_settings(TIMELINE_PULL_FOLLOWERS=2)
+class PullModeTransitionTest(TransactionTestCase):
+    def test_author_below_threshold_is_pushed(self):
+        """Автор ниже порога: посты периода чтения остаются в лентах."""
+        reader, other, author = (
+            User.objects.create_user(username=name)
+            for name in ('Читатель', 'Читатель2', 'Автор')
+        )
+        Follow.objects.create(user=reader, author=author)
+        Follow.objects.create(user=other, author=author)
+        post = Post.objects.create(author=author, text='Пост')
+        self.assertFalse(TimelineEntry.objects.exists())
+        Follow.objects.get(user=other).delete()
+        self.assertEqual(list(follow_feed(reader)), [post])
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=reader, post=post).exists()
+        )
+
+
+@override_settings(TIMELINE_PULL_FOLLOWERS=2)
+class TimelineMigrationTest(TransactionTestCase):
+    def tearDown(self):
+        migrate_to_latest()
+        super().tearDown()
+
+    def test_backfill_skips_pulled_authors(self):
+        """Миграция не пишет в ленты посты авторов в режиме чтения."""
+        apps = migrate('0008_auto_20220403_2236')
+        HistoricalUser = apps.get_model('auth', 'User')
+        HistoricalFollow = apps.get_model('posts', 'Follow')
+        HistoricalPost = apps.get_model('posts', 'Post')
+        reader, other, popular, author = (
+            HistoricalUser.objects.create(username=name)
+            for name in ('Читатель', 'Читатель2', 'Популярный', 'Автор')
+        )
+        for user in (reader, other):
+            HistoricalFollow.objects.create(user=user, author=popular)
+        HistoricalFollow.objects.create(user=reader, author=author)
+        HistoricalPost.objects.create(author=popular, text='Популярный пост')
+        post = HistoricalPost.objects.create(author=author, text='Пост')
+        migrate('0011_timelineentry')
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user_id', 'post_id')),
+            [(reader.pk, post.pk)],
+        )
+        migrate_to_latest()
+        reader = User.objects.get(pk=reader.pk)
+        self.assertEqual(
+            counters.follow_count(reader), follow_feed(reader).count()
+        )
+        self.assertEqual(counters.follow_count(reader), 2)
+
+
+class FollowedAuthorDeletionTest(TransactionTestCase):
+    def test_delete_followed_author(self):
+        """Автора с подписчиками можно удалить вместе с его лентой."""
+        reader = User.objects.create_user(username='Читатель')
+        author = User.objects.create_user(username='Автор')
+        Post.objects.create(author=author, text='Пост')
+        Follow.objects.create(user=reader, author=author)
+        author.delete()
+        self.assertFalse(Follow.objects.exists())
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(AuthorStats.for_user(reader).following_count, 0)
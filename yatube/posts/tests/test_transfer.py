@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import transfer
+from posts.models import (
+    Comment, FeedCounter, Follow, Group, PopularPost, Post
+)
+
+User = get_user_model()
+
+MODELS = ('users', 'groups', 'posts', 'comments', 'follows')
+
+
+class TransferTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        for i in range(5):
+            post = Post.objects.create(
+                author=cls.user, text=f'Пост номер {i}', group=cls.group
+            )
+            Comment.objects.create(post=post, author=cls.reader,
+                                   text=f'Коментарий {i}')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def path(self, name, extension):
+        return os.path.join(self.directory, f'{name}.{extension}')
+
+    def export_all(self, extension):
+        for name in MODELS:
+            call_command('export_data', name, self.path(name, extension),
+                         chunk_size=2, stdout=StringIO())
+
+    def snapshot(self):
+        return {
+            name: list(model.objects.order_by('pk').values_list(*fields))
+            for name, (model, fields) in transfer.MODELS.items()
+        }
+
+    def reload(self, extension):
+        before = self.snapshot()
+        self.export_all(extension)
+        for model in (Follow, Comment, Post, Group, User):
+            model.objects.all().delete()
+        for name in MODELS:
+            call_command('import_data', name, self.path(name, extension),
+                         batch_size=2, stdout=StringIO())
+        self.assertEqual(self.snapshot(), before)
+
+    def test_jsonl_round_trip(self):
+        """Выгрузка и загрузка JSON Lines сохраняют все поля и даты."""
+        self.reload('jsonl')
+
+    def test_csv_round_trip(self):
+        """Выгрузка и загрузка CSV сохраняют все поля и даты."""
+        self.reload('csv')
+
+    def test_import_rebuilds_derived_data(self):
+        """После загрузки есть счетчики, ленты и поиск."""
+        self.reload('jsonl')
+        self.assertEqual(
+            FeedCounter.objects.get(feed='index').posts_count, 5
+        )
+        self.assertEqual(
+            set(Post.objects.values_list('comments_count', flat=True)), {1}
+        )
+        self.assertEqual(self.reader.timeline.count(), 5)
+        self.assertEqual(
+            transfer.search.SearchResults('номер').count(), 5
+        )
+        self.assertEqual(
+            PopularPost.objects.filter(feed='index').count(), 5
+        )
+
+    def test_export_resume(self):
+        """Дозапуск выгрузки продолжает файл после последней строки."""
+        path = self.path('posts', 'csv')
+        call_command('export_data', 'posts', path, stdout=StringIO())
+        Post.objects.create(author=self.user, text='Новый пост')
+        call_command('export_data', 'posts', path, resume=True,
+                     stdout=StringIO())
+        with open(path, encoding='utf-8', newline='') as file:
+            ids = [int(row['id']) for row in transfer.read_rows(file, 'csv')]
+        self.assertEqual(ids, list(
+            Post.objects.order_by('pk').values_list('pk', flat=True)
+        ))
+
+    def test_import_resume(self):
+        """Дозапуск загрузки пропускает уже записанные строки."""
+        path = self.path('groups', 'jsonl')
+        Group.objects.create(title='Вторая', slug='second')
+        call_command('export_data', 'groups', path, stdout=StringIO())
+        Group.objects.all().delete()
+        with open(f'{path}.done', 'w') as file:
+            file.write('1')
+        call_command('import_data', 'groups', path, resume=True,
+                     no_rebuild=True, stdout=StringIO())
+        self.assertEqual(
+            list(Group.objects.values_list('slug', flat=True)), ['second']
+        )
+        self.assertFalse(os.path.exists(f'{path}.done'))
+
+    def test_import_reports_unique_conflicts(self):
+        """Строки с чужим username не считаются загруженными."""
+        path = self.path('users', 'jsonl')
+        call_command('export_data', 'users', path, stdout=StringIO())
+        User.objects.filter(username='reader').update(username='renamed')
+        User.objects.filter(username='auth').delete()
+        User.objects.create_user(username='auth')
+        stdout = StringIO()
+        call_command('import_data', 'users', path, no_rebuild=True,
+                     stdout=stdout)
+        self.assertIn('Загружено строк: 0', stdout.getvalue())
+        self.assertIn(
+            f'конфликта уникальности: 1 (id: {self.user.pk})',
+            stdout.getvalue(),
+        )
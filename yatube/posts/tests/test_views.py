@@ -1,11 +1,22 @@
+import time
+from http import HTTPStatus
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils.http import http_date
 from django import forms
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from yatube.settings import PAGE
 
-from posts.models import Group, Post, Follow
+from posts.caching import get_versions, post_scope
+from posts.models import Comment, Follow, Group, Post
+from posts.paginators import FORWARD, encode_cursor
 
 User = get_user_model()
 
@@ -260,3 +271,534 @@ class PaginatorViewsTest(TestCase):
                     len(response.context['page_obj']),
                     len(['page_obj']) + 2,
                 )
+
+
+MALFORMED_CURSORS = (
+    [1, 2],
+    [{}, 1],
+    [None, None],
+    ['2020-01-01T00:00:00', None],
+    ['2020-01-01T00:00:00', True],
+    ['2020-01-01T00:00:00', 10 ** 30],
+    [[], 'id'],
+)
+
+
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Имя')
+        cls.group = Group.objects.create(
+            title='Тестовое название группы',
+            slug='test_slug',
+            description='Тестовое описание'
+        )
+        for i in range(13):
+            Post.objects.create(
+                author=cls.user,
+                text=f'Текст поста № {i}',
+                group=cls.group
+            )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user.username}),
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def walk(self, url):
+        """Проходит ленту по курсорам и возвращает страницы."""
+        pages = []
+        page_obj = self.guest_client.get(url + '?cursor=').context['page_obj']
+        pages.append(page_obj)
+        while page_obj.has_next():
+            cache.clear()
+            page_obj = self.guest_client.get(
+                url, {'cursor': page_obj.next_cursor}
+            ).context['page_obj']
+            pages.append(page_obj)
+        return pages
+
+    def test_cursor_pages_cover_feed(self):
+        """Курсоры проходят ленту целиком в порядке убывания даты."""
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        for url in self.urls:
+            with self.subTest(url=url):
+                pages = self.walk(url)
+                self.assertEqual([len(page) for page in pages], [PAGE, 3])
+                self.assertFalse(pages[0].has_previous())
+                self.assertEqual(
+                    [post for page in pages for post in page], expected
+                )
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Курсор назад возвращает предыдущую страницу."""
+        url = self.urls[0]
+        first, second = self.walk(url)
+        cache.clear()
+        response = self.guest_client.get(
+            url, {'cursor': second.previous_cursor}
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), list(first))
+        self.assertFalse(page_obj.has_previous())
+        self.assertTrue(page_obj.has_next())
+
+    def test_cursor_breaks_ties_by_id(self):
+        """Посты с одинаковой датой не теряются и не дублируются."""
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+        pages = self.walk(self.urls[0])
+        ids = [post.id for page in pages for post in page]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(ids), 13)
+
+    def test_numbered_page_links_to_cursor(self):
+        """"Следующая" с номерной страницы ведет в режим курсоров."""
+        reader = User.objects.create_user(username='Читатель')
+        Follow.objects.create(user=reader, author=self.user)
+        client = Client()
+        client.force_login(reader)
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        for url in self.urls + (reverse('posts:follow_index'),):
+            with self.subTest(url=url):
+                cache.clear()
+                response = client.get(url)
+                first = response.context['page_obj']
+                self.assertContains(
+                    response, f'?cursor={first.keyset_cursor}'
+                )
+                cache.clear()
+                second = client.get(
+                    url, {'cursor': first.keyset_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(first) + list(second), expected)
+                self.assertFalse(second.has_next())
+
+    def test_numbered_page_and_cursor_share_order(self):
+        """Переход с номерной страницы на курсор не теряет посты."""
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+        self.test_numbered_page_links_to_cursor()
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.guest_client.get(self.urls[0], {'cursor': 'мусор'})
+        self.assertEqual(len(response.context['page_obj']), PAGE)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_malformed_cursor_returns_first_page(self):
+        """Курсор с чужими типами значений не ломает страницу."""
+        post = Post.objects.first()
+        comments_url = reverse(
+            'posts:post_detail', kwargs={'post_id': post.pk}
+        )
+        for values in MALFORMED_CURSORS:
+            cursor = encode_cursor(FORWARD, values)
+            for url in self.urls:
+                with self.subTest(url=url, values=values):
+                    cache.clear()
+                    response = self.guest_client.get(url, {'cursor': cursor})
+                    self.assertEqual(len(response.context['page_obj']), PAGE)
+                    self.assertFalse(
+                        response.context['page_obj'].has_previous()
+                    )
+            with self.subTest(url=comments_url, values=values):
+                cache.clear()
+                response = self.guest_client.get(
+                    comments_url, {'comments': cursor}
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertFalse(response.context['comments'].has_previous())
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Имя')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post_with_comments = Post.objects.create(
+            author=cls.user,
+            text='Пост с комментариями',
+        )
+        for i in range(PAGE):
+            author = User.objects.create_user(username=f'Автор{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}',
+                slug=f'group_{i}',
+                description='Тестовое описание',
+            )
+            Post.objects.create(author=author, text='Тестовый пост',
+                                group=group)
+            Post.objects.create(author=cls.user, text='Тестовый пост',
+                                group=cls.group)
+            Follow.objects.create(user=cls.user, author=author)
+            Comment.objects.create(author=author, post=cls.post_with_comments,
+                                   text='Тестовый коментарий')
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def test_feed_pages_queries_do_not_grow_with_posts(self):
+        """Ленты не делают запрос на каждого автора и группу."""
+        pages = {
+            reverse('posts:index'): 2,
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}): 3,
+            reverse('posts:profile', kwargs={'username': 'Имя'}): 2,
+        }
+        for url, queries in pages.items():
+            with self.subTest(url=url):
+                # Первое чтение заводит счетчик ленты.
+                self.guest_client.get(url)
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    response = self.guest_client.get(url)
+                self.assertEqual(len(response.context['page_obj']), PAGE)
+
+    def test_follow_page_queries_do_not_grow_with_posts(self):
+        """Лента подписок не делает запрос на каждого автора и группу."""
+        self.authorized_client.get(reverse('posts:follow_index'))
+        with self.assertNumQueries(6):
+            response = self.authorized_client.get(
+                reverse('posts:follow_index')
+            )
+        self.assertEqual(len(response.context['page_obj']), PAGE)
+
+    def test_post_detail_queries_do_not_grow_with_comments(self):
+        """Комментарии выбираются вместе с авторами."""
+        url = reverse('posts:post_detail',
+                      kwargs={'post_id': self.post_with_comments.pk})
+        with self.assertNumQueries(3):
+            response = self.guest_client.get(url)
+        self.assertEqual(len(response.context['comments']), PAGE)
+
+
+class FeedCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Имя')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user.username}),
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_unchanged_pages_are_served_from_cache(self):
+        """Повторный запрос без изменений не ходит в базу."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                content = self.guest_client.get(url).content
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(url)
+                self.assertEqual(response.content, content)
+
+    def test_new_post_invalidates_pages(self):
+        """Новый пост сразу виден на главной, в группе и в профиле."""
+        for url in self.urls:
+            self.guest_client.get(url)
+        Post.objects.create(author=self.user, text='Свежий пост',
+                            group=self.group)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), 'Свежий пост')
+
+    def test_deleted_post_disappears(self):
+        """Удаленный пост пропадает со страниц."""
+        post = Post.objects.create(author=self.user, text='Удаляемый пост',
+                                   group=self.group)
+        for url in self.urls:
+            self.assertContains(self.guest_client.get(url), 'Удаляемый пост')
+        post.delete()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.guest_client.get(url),
+                                       'Удаляемый пост')
+
+    def test_group_change_invalidates_group_page(self):
+        """Изменение группы сбрасывает ее страницу."""
+        url = self.urls[1]
+        self.guest_client.get(url)
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertContains(self.guest_client.get(url), 'Новое название')
+
+    def test_group_rename_invalidates_profile(self):
+        """Новое название группы видно в постах на странице автора."""
+        url = self.urls[2]
+        self.guest_client.get(url)
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertContains(self.guest_client.get(url), 'Новое название')
+
+    def test_comment_bumps_post_version(self):
+        """Комментарий сдвигает версию страницы поста."""
+        version = get_versions(post_scope(self.post.pk))
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Коментарий')
+        self.assertNotEqual(get_versions(post_scope(self.post.pk)), version)
+
+
+class PersonalPagesCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Имя')
+        cls.other_user = User.objects.create_user(username='Имя2')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+        Comment.objects.create(post=cls.post, author=cls.other_user,
+                               text='Тестовый коментарий')
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.other_client = Client()
+        self.other_client.force_login(self.other_user)
+        cache.clear()
+
+    def test_anonymous_post_detail_is_cached(self):
+        """Страница поста для гостя отдается из кэша."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        content = self.guest_client.get(url).content
+        with self.assertNumQueries(1):
+            self.assertEqual(self.guest_client.get(url).content, content)
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Новый коментарий')
+        self.assertContains(self.guest_client.get(url), 'Новый коментарий')
+
+    def test_shared_fragment_keeps_personal_parts(self):
+        """Общий фрагмент не смешивает личные части разных пользователей."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.authorized_client.get(url)
+        response = self.other_client.get(url)
+        self.assertContains(response, 'Тестовый коментарий')
+        self.assertContains(response, 'Пользователь: Имя2')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertNotContains(self.guest_client.get(url),
+                               'csrfmiddlewaretoken')
+
+    def test_authorized_feed_reuses_fragment(self):
+        """Авторизованный запрос берет список постов из фрагмента."""
+        urls = (
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'Имя'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.other_client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.authorized_client.get(url)
+                self.assertFalse(any(
+                    '"posts_post"."text"' in query['sql']
+                    for query in queries
+                ))
+                self.assertContains(response, 'Тестовый пост')
+                self.assertContains(response, 'Пользователь: Имя')
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Имя')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def test_revalidation_returns_not_modified(self):
+        """Повтор с If-None-Match получает 304 без рендера шаблона."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                # Страница поста узнает автора и группу одним запросом.
+                with self.assertNumQueries(int(url == self.urls[3])):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.NOT_MODIFIED)
+                self.assertEqual(response.content, b'')
+
+    def test_edit_is_not_hidden_by_if_modified_since(self):
+        """Правка поста не прячется за 304 по If-Modified-Since."""
+        since = http_date(time.time() + 60)
+        for url in self.urls[:3]:
+            self.guest_client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Другой текст'
+        post.save()
+        for url in self.urls[:3]:
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=since
+                )
+                self.assertNotIn('Last-Modified', response)
+                self.assertContains(response, 'Другой текст')
+
+    def test_changes_and_viewer_change_etag(self):
+        """Комментарий и другой зритель дают новый ETag."""
+        url = self.urls[3]
+        etag = self.guest_client.get(url)['ETag']
+        self.assertNotEqual(self.authorized_client.get(url)['ETag'], etag)
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Коментарий')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Коментарий')
+
+    def test_follow_changes_follow_page_etag(self):
+        """Подписка меняет ETag ленты подписок."""
+        url = reverse('posts:follow_index')
+        etag = self.authorized_client.get(url)['ETag']
+        self.assertEqual(
+            self.authorized_client.get(
+                url, HTTP_IF_NONE_MATCH=etag
+            ).status_code,
+            HTTPStatus.NOT_MODIFIED,
+        )
+        Follow.objects.create(
+            user=self.user,
+            author=User.objects.create_user(username='Автор'),
+        )
+        self.assertEqual(
+            self.authorized_client.get(
+                url, HTTP_IF_NONE_MATCH=etag
+            ).status_code,
+            HTTPStatus.OK,
+        )
+
+
+class ElidedPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Имя')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Текст поста № {i}')
+            for i in range(PAGE * 20)
+        )
+        call_command('recount_feeds', stdout=StringIO())
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_page_window(self):
+        """Список страниц: края и окно вокруг текущей."""
+        page_obj = self.guest_client.get(
+            reverse('posts:index'), {'page': 10}
+        ).context['page_obj']
+        ellipsis = page_obj.paginator.ELLIPSIS
+        self.assertEqual(
+            page_obj.elided_page_range,
+            [1, 2, ellipsis, 7, 8, 9, 10, 11, 12, 13, ellipsis, 19, 20],
+        )
+        first = self.guest_client.get(
+            reverse('posts:index')
+        ).context['page_obj']
+        self.assertEqual(
+            first.elided_page_range, [1, 2, 3, 4, ellipsis, 19, 20]
+        )
+
+    def test_rendered_links_are_bounded(self):
+        """Число ссылок пагинатора не растет с числом страниц."""
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response, '?page=10"')
+        self.assertContains(response, '?page=20"', count=2)
+        self.assertContains(response, '…')
+
+
+class CommentThreadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Имя')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        for i in range(7):
+            Comment.objects.create(post=cls.post, author=cls.user,
+                                   text=f'Коментарий {i}')
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    @mock.patch('posts.views.COMMENTS_PAGE', 3)
+    def test_comment_pages(self):
+        """Комментарии идут страницами по курсору в порядке создания."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        texts = []
+        cursor = ''
+        while cursor is not None:
+            with self.assertNumQueries(3):
+                response = self.guest_client.get(url, {'comments': cursor})
+            comments = response.context['comments']
+            self.assertLessEqual(len(comments), 3)
+            texts.extend(comment.text for comment in comments)
+            cursor = comments.next_cursor
+        self.assertEqual(texts, [f'Коментарий {i}' for i in range(7)])
+
+    def test_comments_count(self):
+        """Число комментариев хранится в посте."""
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.comments_count, 7)
+        Comment.objects.create(post=None, author=self.user, text='Ничей')
+        Comment.objects.filter(post=post).first().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 6)
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, 'Комментариев: <span>\n        6')
@@ -0,0 +1,35 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+
+def query_plan(queryset):
+    """Строки EXPLAIN QUERY PLAN для запроса (только SQLite)."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(plan):
+    """Таблицы, которые читаются целиком, без индекса."""
+    return [
+        step for step in plan
+        if step.startswith('SCAN') and ' USING ' not in step
+    ]
+
+
+def temp_sorts(plan):
+    return [step for step in plan if 'TEMP B-TREE' in step]
+
+
+def migrate(name):
+    """Переводит базу на миграцию posts name и отдает ее модели."""
+    executor = MigrationExecutor(connection)
+    executor.migrate([('posts', name)])
+    executor.loader.build_graph()
+    return executor.loader.project_state(('posts', name)).apps
+
+
+def migrate_to_latest():
+    executor = MigrationExecutor(connection)
+    executor.migrate(executor.loader.graph.leaf_nodes())
@@ -0,0 +1,142 @@
+import logging
+
+from django.conf import settings
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from posts import caching, tasks
+
+logger = logging.getLogger(__name__)
+
+
+class PregeneratedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который не уменьшает картинки в запросе.
+
+    Готовая миниатюра берется из хранилища ключей, а если ее еще нет,
+    ее генерация ставится в фоновую очередь, и до тех пор шаблон
+    получает исходную картинку.
+    """
+
+    def prepare(self, file_, geometry_string, options):
+        """Исходник и миниатюра с теми же опциями, что у ThumbnailBackend."""
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return source, ImageFile(name, default.storage)
+
+    def get_ready(self, file_, geometry_string, **options):
+        """Готовая миниатюра или None; недостающая ставится в очередь."""
+        source, thumbnail = self.prepare(
+            file_, geometry_string, dict(options)
+        )
+        cached = default.kvstore.get(thumbnail)
+        if not cached:
+            schedule(source.name, geometry_string, options)
+            return None
+        return cached
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        return (
+            self.get_ready(file_, geometry_string, **options)
+            or ImageFile(file_)
+        )
+
+
+def generate(name, geometry_string, options):
+    """Создает миниатюру и записывает ее в хранилище ключей.
+
+    Пока миниатюры не было, страницы с этой картинкой строились с
+    исходником и так легли в кэш, поэтому их версии сдвигаются.
+    """
+    thumbnail = ThumbnailBackend().get_thumbnail(
+        name, geometry_string, **options
+    )
+    if not default.kvstore.get(thumbnail):
+        logger.warning('Не удалось создать миниатюру для %s', name)
+        return None
+    caching.bump(*caching.image_scopes(name))
+    return thumbnail
+
+
+def schedule(name, geometry_string, options):
+    key = ('thumbnail', name, geometry_string, tuple(sorted(options.items())))
+    return tasks.submit(key, generate, name, geometry_string, options)
+
+
+def modern_formats():
+    """Форматы из POSTS_THUMBNAIL_FORMATS, которые умеют Pillow и sorl."""
+    Image.init()
+    return [
+        image_format for image_format in settings.POSTS_THUMBNAIL_FORMATS
+        if image_format in Image.SAVE and image_format in EXTENSIONS
+    ]
+
+
+def variants():
+    """(формат, ширина, геометрия, опции) для srcset картинки поста.
+
+    Формат None - обычная миниатюра sorl (JPEG), она есть всегда.
+    Высота считается по пропорциям POSTS_THUMBNAIL_SIZE.
+    """
+    width, height = settings.POSTS_THUMBNAIL_SIZE
+    result = []
+    for image_format in (None, *modern_formats()):
+        options = dict(settings.POSTS_THUMBNAIL_OPTIONS)
+        if image_format:
+            options['format'] = image_format
+        for variant_width in settings.POSTS_THUMBNAIL_WIDTHS:
+            variant_height = round(variant_width * height / width)
+            result.append((
+                image_format, variant_width,
+                f'{variant_width}x{variant_height}', options,
+            ))
+    return result
+
+
+def presets():
+    """Все размеры, которые создаются заранее после загрузки."""
+    seen = set()
+    for geometry_string, options in (
+        *settings.POSTS_THUMBNAILS,
+        *((geometry, options) for _, _, geometry, options in variants()),
+    ):
+        key = (geometry_string, tuple(sorted(options.items())))
+        if key not in seen:
+            seen.add(key)
+            yield geometry_string, dict(options)
+
+
+def schedule_all(name):
+    """Ставит в очередь все размеры из presets() для картинки."""
+    for geometry_string, options in presets():
+        schedule(name, geometry_string, options)
+
+
+def responsive(image):
+    """Готовые варианты картинки для <picture>.
+
+    Возвращает (варианты по форматам, запасная миниатюра): ширины,
+    которые еще не созданы, в srcset не попадают, пока их делает
+    фоновая очередь.
+    """
+    backend = PregeneratedThumbnailBackend()
+    formats = {}
+    for image_format, width, geometry_string, options in variants():
+        thumbnail = backend.get_ready(image, geometry_string, **options)
+        if thumbnail is not None:
+            formats.setdefault(image_format, []).append((width, thumbnail))
+    fallback = formats.pop(None, None)
+    return formats, fallback
@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from posts import counters, tasks
+from posts.models import AuthorStats, Follow, Post, TimelineEntry
+
+BATCH_SIZE = 1000
+
+
+def is_pulled(author_id):
+    """Посты популярных авторов читаются при запросе, а не раскладываются."""
+    stats = AuthorStats.objects.filter(user_id=author_id).first()
+    followers = stats.followers_count if stats else 0
+    return followers >= settings.TIMELINE_PULL_FOLLOWERS
+
+
+def fan_out(post):
+    if is_pulled(post.author_id):
+        return
+    followers = list(Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True))
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post.pk,
+                          author_id=post.author_id, pub_date=post.pub_date)
+            for user_id in followers
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    counters.shift_timelines(followers, 1)
+
+
+def backfill(user_id, author_id):
+    if is_pulled(author_id):
+        return
+    posts = dict(Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:settings.TIMELINE_BACKFILL])
+    present = set(TimelineEntry.objects.filter(
+        user_id=user_id, post_id__in=posts
+    ).values_list('post_id', flat=True))
+    entries = [
+        TimelineEntry(user_id=user_id, post_id=post_id,
+                      author_id=author_id, pub_date=pub_date)
+        for post_id, pub_date in posts.items() if post_id not in present
+    ]
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+    counters.shift_timelines([user_id], len(entries))
+
+
+def prune(user_id, author_id):
+    deleted, _ = TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).delete()
+    counters.shift_timelines([user_id], -deleted)
+
+
+def drop_post(post_id):
+    """Пост удаляется: его записи уйдут из лент каскадом."""
+    counters.shift_timelines(TimelineEntry.objects.filter(
+        post_id=post_id
+    ).values_list('user_id', flat=True), -1)
+
+
+def push_author(author_id):
+    """Раскладывает последние посты автора по лентам всех подписчиков."""
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    for user_id in followers.iterator():
+        backfill(user_id, author_id)
+
+
+def unfollowed(author_id):
+    """Отписка могла опустить автора ниже порога TIMELINE_PULL_FOLLOWERS.
+
+    Пока автор читался при запросе, его посты в ленты не писались;
+    после перехода они пропали бы из лент подписчиков, поэтому после
+    коммита они раскладываются заново.
+    """
+    crossed = AuthorStats.objects.filter(
+        user_id=author_id,
+        followers_count=settings.TIMELINE_PULL_FOLLOWERS - 1,
+    ).exists()
+    if crossed:
+        transaction.on_commit(lambda: tasks.submit(
+            ('timeline', author_id), push_author, author_id
+        ))
+
+
+def follow_feed(user):
+    """Лента подписок: записи из ленты плюс посты популярных авторов."""
+    pulled = list(Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gte=settings.TIMELINE_PULL_FOLLOWERS,
+    ).values_list('author_id', flat=True))
+    if not pulled:
+        return Post.objects.feed().filter(
+            timeline_entries__user=user
+        ).order_by('-timeline_entries__pub_date', '-timeline_entries__id')
+    pushed = TimelineEntry.objects.filter(user=user).values('post')
+    return Post.objects.feed().filter(
+        Q(pk__in=pushed) | Q(author_id__in=pulled)
+    ).order_by('-pub_date', '-id')
@@ -0,0 +1,247 @@
+"""Потоковый перенос пользователей, групп, постов, комментариев и подписок.
+
+Строки читаются и пишутся по одной, поэтому память не зависит от
+размера таблиц. Поддерживаются JSON Lines и CSV с заголовком.
+"""
+import csv
+import datetime
+import json
+import os
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from posts import caching, search, timeline
+from posts.models import Comment, Follow, Group, Post, User
+
+MODELS = {
+    'users': (User, (
+        'id', 'username', 'password', 'first_name', 'last_name', 'email',
+        'is_active', 'is_staff', 'is_superuser', 'date_joined', 'last_login',
+    )),
+    'groups': (Group, ('id', 'title', 'slug', 'description')),
+    'posts': (Post, (
+        'id', 'text', 'pub_date', 'author_id', 'group_id', 'image',
+    )),
+    'comments': (Comment, ('id', 'post_id', 'author_id', 'text', 'created')),
+    'follows': (Follow, ('id', 'user_id', 'author_id')),
+}
+FORMATS = ('jsonl', 'csv')
+
+
+class Encoder(DjangoJSONEncoder):
+    """Даты с микросекундами: DjangoJSONEncoder режет их до миллисекунд."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def guess_format(path):
+    return 'csv' if path.endswith('.csv') else 'jsonl'
+
+
+def export_rows(model, fields, after_id=0, chunk_size=2000):
+    """Строки таблицы по возрастанию id, кусками по chunk_size.
+
+    Каждый кусок - отдельный запрос WHERE id > последнего, поэтому
+    в памяти не больше одного куска, а выгрузку можно продолжить.
+    """
+    queryset = model.objects.order_by('pk').values(*fields)
+    while True:
+        chunk = list(queryset.filter(pk__gt=after_id)[:chunk_size])
+        if not chunk:
+            return
+        yield from chunk
+        after_id = chunk[-1]['id']
+
+
+class JsonlWriter:
+    def __init__(self, file, fields, append):
+        self.file = file
+
+    def write(self, row):
+        self.file.write(
+            json.dumps(row, cls=Encoder, ensure_ascii=False) + '\n'
+        )
+
+
+class CsvWriter:
+    def __init__(self, file, fields, append):
+        self.encoder = Encoder()
+        self.writer = csv.DictWriter(file, fieldnames=fields)
+        if not append:
+            self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow({
+            name: '' if value is None else (
+                value if isinstance(value, (str, int))
+                else self.encoder.default(value)
+            )
+            for name, value in row.items()
+        })
+
+
+WRITERS = {'jsonl': JsonlWriter, 'csv': CsvWriter}
+
+
+def read_rows(file, file_format):
+    if file_format == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def last_exported_id(path, file_format):
+    """id последней строки файла; файл читается потоком."""
+    if not os.path.exists(path):
+        return 0
+    last = 0
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in read_rows(file, file_format):
+            last = int(row['id'])
+    return last
+
+
+def to_instance(model, fields, row):
+    values = {}
+    for name in fields:
+        field = model._meta.get_field(name)
+        value = row.get(name)
+        if value == '' and field.null:
+            value = None
+        elif value is not None:
+            value = field.to_python(value)
+        values[field.attname] = value
+    return model(**values)
+
+
+@contextmanager
+def keep_auto_now(model):
+    """Даты из файла вместо auto_now_add на время вставки."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Batch:
+    """Итог пачки: сколько строк прочитано, что записано и что нет.
+
+    conflicts - строки с новым id, которые не вставились из-за других
+    ограничений уникальности (username, slug, пара подписки).
+    """
+
+    def __init__(self, rows, inserted, conflicts):
+        self.rows = rows
+        self.inserted = inserted
+        self.conflicts = conflicts
+
+
+def import_rows(model, fields, rows, batch_size=1000):
+    """Вставляет строки пачками, каждая пачка - своя транзакция.
+
+    Уже существующие id пропускаются, поэтому повторный запуск
+    безопасен. Генератор отдает Batch для каждой пачки.
+    """
+    rows = iter(rows)
+    with keep_auto_now(model):
+        while True:
+            batch = [
+                to_instance(model, fields, row)
+                for row in islice(rows, batch_size)
+            ]
+            if not batch:
+                break
+            with transaction.atomic():
+                existing = set(model.objects.filter(
+                    pk__in=[obj.pk for obj in batch]
+                ).values_list('pk', flat=True))
+                fresh = [obj for obj in batch if obj.pk not in existing]
+                model.objects.bulk_create(fresh, ignore_conflicts=True)
+                written = set(model.objects.filter(
+                    pk__in=[obj.pk for obj in fresh]
+                ).values_list('pk', flat=True))
+            yield Batch(
+                len(batch),
+                [obj for obj in fresh if obj.pk in written],
+                [obj for obj in fresh if obj.pk not in written],
+            )
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+            cursor.execute(sql)
+
+
+def index_batch(name, batch):
+    """Для вставленной пачки делает то, что сделали бы сигналы."""
+    if name == 'posts':
+        search.reindex(Post.objects.filter(pk__in=[post.pk for post in batch]))
+    elif name == 'follows':
+        for follow in batch:
+            if follow.user_id and follow.author_id:
+                timeline.backfill(follow.user_id, follow.author_id)
+
+
+def collect_touched(name, batch, touched):
+    """Запоминает id, чьи кэши и ленты нужно обновить после импорта."""
+    if name == 'posts':
+        touched['authors'].update(post.author_id for post in batch)
+        touched['groups'].update(
+            post.group_id for post in batch if post.group_id
+        )
+    elif name == 'comments':
+        touched['posts'].update(
+            comment.post_id for comment in batch if comment.post_id
+        )
+    elif name == 'follows':
+        touched['users'].update(
+            follow.user_id for follow in batch if follow.user_id
+        )
+
+
+def chunks(ids, size=500):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def finish_import(name, touched):
+    """Раскладывает новые посты по лентам и сдвигает версии кэша."""
+    scopes = set()
+    if name == 'posts':
+        scopes.add(caching.index_scope())
+        for ids in chunks(touched['authors']):
+            for user_id, author_id in Follow.objects.filter(
+                author_id__in=ids
+            ).values_list('user_id', 'author_id').iterator():
+                timeline.backfill(user_id, author_id)
+            scopes.update(
+                caching.author_scope(username) for username in
+                User.objects.filter(pk__in=ids).values_list(
+                    'username', flat=True
+                )
+            )
+        for ids in chunks(touched['groups']):
+            scopes.update(
+                caching.group_scope(slug) for slug in
+                Group.objects.filter(pk__in=ids).values_list(
+                    'slug', flat=True
+                )
+            )
+    scopes.update(caching.post_scope(pk) for pk in touched['posts'])
+    scopes.update(caching.follow_scope(pk) for pk in touched['users'])
+    caching.bump(*scopes)
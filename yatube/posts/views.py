@@ -1,60 +1,156 @@
+from functools import partial
+
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
-
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
+
+from core.db import retry_write
+from core.replicas import read_from_replica
+from posts import counters, images, popular
+from posts.caching import (
+    author_scope, cache_feed, feed_etag, fragment_context, group_scope,
+    index_scope, post_detail_scopes, post_scopes
+)
+from posts.follows import follow_graph
 from posts.forms import PostForm, CommentForm
-from posts.models import Group, Post, User, Follow
-from yatube.settings import PAGE
-
-
-def get_one_page(request, posts):
-    paginator = Paginator(posts, PAGE)
+from posts.models import AuthorStats, Group, Post, User, Follow
+from posts.paginators import CursorPaginator, ElidedPaginator
+from posts.search import SearchResults
+from posts.timeline import follow_feed
+from yatube.settings import COMMENTS_PAGE, PAGE
+
+
+def get_one_page(request, posts, count=None):
+    """Страница ленты; count - функция, которая отдает размер ленты.
+
+    Номерные страницы остаются для переходов по номеру, а "Следующая"
+    ведет по курсору, так что листание ленты идет без OFFSET.
+    """
+    cursor = request.GET.get('cursor')
+    if cursor is not None:
+        return CursorPaginator(posts, PAGE).get_page(cursor)
+    paginator = ElidedPaginator(
+        posts, PAGE, count=count, ordering=CursorPaginator.ORDERING
+    )
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
 
 
-@cache_page(20)
+@read_from_replica
+@condition(feed_etag(index_scope))
+@cache_feed(index_scope)
 def index(request):
     return render(
         request,
         'posts/index.html',
-        {'page_obj': get_one_page(request, Post.objects.all())}
+        {
+            'page_obj': get_one_page(
+                request, Post.objects.feed(), counters.index_count
+            ),
+            **fragment_context(request, index_scope()),
+        }
     )
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = ElidedPaginator(SearchResults(query), PAGE)
+    return render(
+        request,
+        'posts/search.html',
+        {
+            'page_obj': paginator.get_page(request.GET.get('page')),
+            'query': query,
+            'page_query': urlencode({'q': query}) + '&',
+        }
+    )
+
+
+@read_from_replica
+def popular_index(request):
+    slug = request.GET.get('group')
+    group = get_object_or_404(Group, slug=slug) if slug else None
+    paginator = ElidedPaginator(
+        popular.popular_posts(group), PAGE,
+        count=partial(popular.popular_count, group),
+    )
+    return render(
+        request,
+        'posts/popular.html',
+        {
+            'page_obj': paginator.get_page(request.GET.get('page')),
+            'group': group,
+            'page_query': urlencode({'group': slug}) + '&' if slug else '',
+        }
+    )
+
+
+@read_from_replica
+@condition(feed_etag(group_scope))
+@cache_feed(group_scope)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = get_one_page(request, posts)
+    posts = group.posts.feed()
+    page_obj = get_one_page(
+        request, posts, partial(counters.group_count, group)
+    )
     return render(
         request,
         'posts/group_list.html',
-        {'page_obj': page_obj, 'group': group}
+        {
+            'page_obj': page_obj,
+            'group': group,
+            **fragment_context(request, group_scope(slug)),
+        }
     )
 
 
+@read_from_replica
+@condition(feed_etag(author_scope))
+@cache_feed(author_scope)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    page_obj = get_one_page(request, posts)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    posts = author.posts.feed()
+    page_obj = get_one_page(
+        request, posts, partial(counters.author_count, author)
+    )
     return render(
         request,
         'posts/profile.html',
-        {'page_obj': page_obj, 'author': author}
+        {
+            'page_obj': page_obj,
+            'author': author,
+            'stats': AuthorStats.for_user(author),
+            'following': follow_graph(request).is_following(author.pk),
+            **fragment_context(request, author_scope(username)),
+        }
     )
 
 
+@read_from_replica
+@condition(feed_etag(post_detail_scopes))
+@cache_feed(post_detail_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comment = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    comments = CursorPaginator(
+        post.comments.select_related('author'),
+        COMMENTS_PAGE,
+        ordering=('created', 'id'),
+    ).get_page(request.GET.get('comments'))
     form = CommentForm(request.POST or None)
     author = post.author
     context = {
         'post': post,
-        'comment': comment,
+        'comments': comments,
         'form': form,
         'author': author,
+        'stats': AuthorStats.for_user(author),
+        **fragment_context(request, *post_scopes(post)),
     }
     return render(request, 'posts/post_detail.html', context)
 
@@ -68,7 +164,9 @@ def post_create(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        upload = images.defer_upload(form, post)
+        retry_write(post.save)
+        images.schedule(post, upload)
         return redirect('posts:profile', request.user.username)
     context = {
         'form': form,
@@ -87,7 +185,12 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save(commit=False)
+        upload = images.defer_upload(form, post)
+        retry_write(
+            post.save, update_fields=images.edit_fields(form, upload)
+        )
+        images.schedule(post, upload)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'form': form,
@@ -103,15 +206,18 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        retry_write(comment.save)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@read_from_replica
 @login_required
+@condition(feed_etag(index_scope))
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user)
-    page_obj = get_one_page(request, posts)
+    posts = follow_feed(request.user)
+    page_obj = get_one_page(
+        request, posts, partial(counters.follow_count, request.user)
+    )
     context = {
         'posts': posts,
         'page_obj': page_obj
@@ -124,7 +230,8 @@ def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
     if user != author:
-        Follow.objects.get_or_create(
+        retry_write(
+            Follow.objects.get_or_create,
             user=user,
             author=author,
         )
@@ -133,9 +240,7 @@ def profile_follow(request, username):
 
 @login_required
 def profile_unfollow(request, username):
-    Follow.objects.filter(
-        user=request.user, author__username=username
-    ).exists()
-    get_object_or_404(
-        Follow, user=request.user, author__username=username).delete()
+    follow = get_object_or_404(
+        Follow, user=request.user, author__username=username)
+    retry_write(follow.delete)
     return redirect('posts:profile', username=username)
@@ -43,9 +43,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'core.replicas.ReplicaStickinessMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -76,13 +78,46 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Соединения с базой живут столько секунд, а не один запрос: pragma
+# из core.db выполняются при открытии соединения.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'OPTIONS': {
+            # Сколько секунд запись ждет чужую блокировку.
+            'timeout': float(os.environ.get('SQLITE_BUSY_TIMEOUT', 5)),
+        },
     }
 }
 
+# Реплики только для чтения: пути к копиям базы через os.pathsep.
+# Базу на них копирует внешний инструмент, миграции их не трогают.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+    filter(None, os.environ.get('DB_REPLICAS', '').split(os.pathsep)), 1
+):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+
+# Сколько секунд после записи клиент читает с основной базы.
+REPLICA_STICKY_COOKIE = 'primary_reads'
+REPLICA_STICKY_SECONDS = 10
+
+# Переопределения pragma из core.db.PRAGMAS.
+SQLITE_PRAGMAS = {}
+
+# Повторы записи, которой не хватило timeout, и первая пауза в секундах.
+SQLITE_WRITE_ATTEMPTS = 4
+SQLITE_RETRY_DELAY = 0.05
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -131,13 +166,110 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Картинки постов называются по хэшу содержимого: одинаковые файлы
+# хранятся один раз, а ненужные удаляет collect_media_garbage.
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+
+# Файлы без ссылок удаляются не раньше, чем через столько часов.
+POSTS_MEDIA_GRACE_HOURS = 24
+
+# Загрузки больше этого размера пишутся кусками во временный файл.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+
+# Картинки постов уменьшаются до этого размера и пережимаются в фоне.
+POSTS_IMAGE_MAX_SIZE = (1920, 1920)
+
+POSTS_IMAGE_QUALITY = 85
+
+# Загрузки ждут обработки здесь, вне MEDIA_ROOT: исходники с EXIF
+# и геометками не должны раздаваться.
+POSTS_STAGING_ROOT = os.path.join(BASE_DIR, 'staging')
+
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 PAGE = 10
 
+COMMENTS_PAGE = 50
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
+
+# Тестам нужны кэш в памяти и задачи без фоновых потоков.
+TEST_RUNNER = 'core.testing.TestRunner'
+
+# Авторы, у которых подписчиков не меньше этого числа, не раскладывают
+# посты по лентам подписчиков: их посты подтягиваются при чтении.
+TIMELINE_PULL_FOLLOWERS = 1000
+
+# Сколько последних постов автора попадает в ленту при подписке.
+TIMELINE_BACKFILL = 500
+
+# Страницы лент живут в кэше долго: их сбрасывают сигналы моделей.
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Множество авторов, на которых подписан пользователь, хранится в кэше
+# столько секунд; при большем числе подписок оно не кэшируется.
+FOLLOW_CACHE_TIMEOUT = 60 * 60
+FOLLOW_CACHE_MAX_AUTHORS = 1000
+
+# Сколько рекомендаций подписок хранить и показывать каждому читателю.
+FOLLOW_SUGGESTIONS = 10
+
+# Популярное: за столько часов вес события падает вдвое.
+POPULAR_HALF_LIFE_HOURS = 24
+# Веса публикации, комментария и нового подписчика автора; followers -
+# степень, в которой число подписчиков умножает вес публикации.
+POPULAR_WEIGHTS = {
+    'post': 1.0,
+    'comment': 1.0,
+    'follow': 0.5,
+    'followers': 0.5,
+}
+# Сколько последних постов автора поднимает новый подписчик.
+POPULAR_FOLLOW_POSTS = 5
+# Сколько лучших постов хранить в общей ленте и в ленте каждой группы.
+POPULAR_TOP = 500
+
+THUMBNAIL_BACKEND = 'posts.thumbnails.PregeneratedThumbnailBackend'
+
+# Миниатюры картинок постов для srcset: ширины, пропорции и опции sorl.
+# Варианты создаются заранее, после загрузки, в JPEG и в форматах из
+# POSTS_THUMBNAIL_FORMATS, если Pillow и sorl-thumbnail умеют их писать.
+POSTS_THUMBNAIL_SIZE = (960, 339)
+POSTS_THUMBNAIL_WIDTHS = (320, 640, 960)
+POSTS_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+POSTS_THUMBNAIL_FORMATS = ('AVIF', 'WEBP')
+POSTS_THUMBNAIL_SIZES = '(max-width: 992px) 100vw, 960px'
+
+# Другие размеры, которые тоже нужно создавать заранее.
+POSTS_THUMBNAILS = ()
+
+# Потоки для фоновых задач; 0 - выполнять задачи сразу, в самом запросе.
+POSTS_BACKGROUND_WORKERS = 2
+
+# Доля запросов, для которых ProfilingMiddleware снимает замеры SQL,
+# шаблонов и кэша; 0 - middleware выключен.
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}